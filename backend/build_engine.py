@@ -0,0 +1,99 @@
+"""
+Build TensorRT FP16 engines for the face classifiers (SFA_BACKEND=trt).
+
+Each HuggingFace classifier is exported to ONNX and compiled with trtexec
+into model_cache/trt/, where FaceAnalyzer looks for it:
+
+    python build_engine.py
+    python build_engine.py --models age emotion
+"""
+
+import argparse
+import logging
+import shutil
+import subprocess
+from pathlib import Path
+
+import torch
+from torch import nn
+from transformers import AutoModelForImageClassification
+
+from face_analyzer import (AGE_MODEL_NAME, EMOTION_MODEL_NAME, RACE_MODEL_NAME,
+                           MAX_FACES, MODEL_INPUT_SIZE, TRT_MAX_BATCH, trt_engine_path)
+
+logger = logging.getLogger(__name__)
+
+MODELS = {
+    "age": AGE_MODEL_NAME,
+    "race": RACE_MODEL_NAME,
+    "emotion": EMOTION_MODEL_NAME,
+}
+
+
+class LogitsOnly(nn.Module):
+    """Expose a classifier as pixel_values -> logits for ONNX export"""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return self.model(pixel_values=pixel_values).logits
+
+
+def export_onnx(model_name: str, onnx_path: Path):
+    """Export a classifier to ONNX with a dynamic batch dimension"""
+    model = LogitsOnly(AutoModelForImageClassification.from_pretrained(model_name)).eval()
+    dummy = torch.randn(1, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE)
+    torch.onnx.export(
+        model, (dummy,), str(onnx_path),
+        opset_version=17,
+        input_names=["pixel_values"],
+        output_names=["logits"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+    )
+
+
+def build_engine(onnx_path: Path, engine_path: Path, trtexec: str = "trtexec"):
+    """Compile an ONNX model to an FP16 engine for batches of 1..TRT_MAX_BATCH"""
+    def shape(batch: int) -> str:
+        return f"pixel_values:{batch}x3x{MODEL_INPUT_SIZE}x{MODEL_INPUT_SIZE}"
+
+    subprocess.run([
+        trtexec,
+        f"--onnx={onnx_path}",
+        f"--saveEngine={engine_path}",
+        "--fp16",
+        f"--minShapes={shape(1)}",
+        f"--optShapes={shape(MAX_FACES)}",
+        f"--maxShapes={shape(TRT_MAX_BATCH)}",
+    ], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build TensorRT FP16 engines for the face classifiers")
+    parser.add_argument("--models", nargs="+", choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument("--trtexec", default="trtexec", help="Path to the trtexec binary")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if shutil.which(args.trtexec) is None:
+        parser.error(f"{args.trtexec} not found; install TensorRT or pass --trtexec")
+
+    for key in args.models:
+        model_name = MODELS[key]
+        engine_path = trt_engine_path(model_name)
+        engine_path.parent.mkdir(parents=True, exist_ok=True)
+        onnx_path = engine_path.with_suffix(".onnx")
+
+        logger.info(f"Exporting {model_name} to {onnx_path}")
+        export_onnx(model_name, onnx_path)
+        logger.info(f"Building TensorRT engine {engine_path}")
+        build_engine(onnx_path, engine_path, args.trtexec)
+
+    logger.info("All engines built")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,89 @@
+from __future__ import annotations
+
 import cv2
 import numpy as np
-import mediapipe as mp
-from transformers import pipeline, AutoModelForImageClassification, AutoProcessor
-import torch
-from PIL import Image, ImageDraw, ImageFont
 import logging
-from typing import Dict, List, Tuple, Any
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Any
 import os
+import contextlib
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 import io
 import base64
 
+# torch, transformers and mediapipe take seconds to import; they are imported
+# where first needed so importing this module stays cheap
+if TYPE_CHECKING:
+    import torch
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def cpu_threads_per_worker() -> int:
+    """CPU cores available to each server worker (WEB_CONCURRENCY workers split the cores)"""
+    workers = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+# OpenMP/MKL size their thread pools when torch is first imported, so these
+# must be set before torch is (lazily) imported
+os.environ.setdefault("OMP_NUM_THREADS", str(cpu_threads_per_worker()))
+os.environ.setdefault("MKL_NUM_THREADS", str(cpu_threads_per_worker()))
+
+# Input resolution shared by all ViT classifiers
+MODEL_INPUT_SIZE = 224
+
+# Upper bound on faces tracked by Face Mesh per image
+MAX_FACES = 10
+
+# Video tracking: run face detection every N frames and reuse boxes in between
+DETECTION_INTERVAL = 5
+# Minimum IOU for a fresh detection to inherit the previous frame's age/race
+TRACKING_IOU_THRESHOLD = 0.5
+
+# HuggingFace checkpoints
+AGE_MODEL_NAME = "nateraw/vit-age-classifier"
+EMOTION_MODEL_NAME = "trpakov/vit-face-expression"
+RACE_MODEL_NAME = "rizvandwiki/gender-classification"
+
+# Exported/converted model artifacts (ONNX, ...) are cached here
+MODEL_CACHE_DIR = Path(__file__).parent / os.environ.get("MODEL_CACHE_DIR", "model_cache")
+
+# Largest batch a TensorRT engine is built for (see build_engine.py); larger
+# batches are split
+TRT_MAX_BATCH = 32
+
+# Annotation text style used by draw_analysis_results
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_FONT_SCALE = 0.6
+LABEL_THICKNESS = 1
+
+# Landmarks kept per face in analysis results
+RESULT_LANDMARKS = 10
+
+# Reported when a classifier is unavailable: zero confidence marks the value as unknown
+UNKNOWN_AGE = (0, 0.0)
+UNKNOWN_LABEL = ("Unknown", 0.0)
+
+# Race categories (adjust based on model)
+RACE_CATEGORIES = ["Asian", "Black", "Indian", "White", "Middle Eastern"]
+
+# Map model labels to standard emotion categories
+EMOTION_LABEL_MAPPING = {
+    'HAPPY': 'Happy',
+    'SAD': 'Sad', 
+    'ANGRY': 'Angry',
+    'FEAR': 'Fear',
+    'SURPRISE': 'Surprise',
+    'DISGUST': 'Disgust',
+    'NEUTRAL': 'Neutral'
+}
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when a classifier is used but its model failed to load"""
+
 @dataclass
 class FaceAnalysisResult:
     """Results from face analysis"""
@@ -26,45 +96,285 @@ class FaceAnalysisResult:
     race_confidence: float
     emotion: str
     emotion_confidence: float
-    landmarks: List[Tuple[int, int]]
+    landmarks: np.ndarray  # (K, 2) int32 pixel coordinates
+
+@dataclass
+class FaceBatchResult:
+    """Results for all faces in one image, one array (or list) per field"""
+    bboxes: np.ndarray  # (N, 4) int32 x, y, w, h
+    confidences: np.ndarray  # (N,)
+    ages: np.ndarray  # (N,) int32
+    age_confidences: np.ndarray  # (N,)
+    races: List[str]
+    race_confidences: np.ndarray  # (N,)
+    emotions: List[str]
+    emotion_confidences: np.ndarray  # (N,)
+    landmark_counts: np.ndarray  # (N,) int32
+    
+    def __len__(self) -> int:
+        return len(self.confidences)
+    
+    @classmethod
+    def empty(cls) -> "FaceBatchResult":
+        """Result for an image without faces"""
+        return cls(
+            bboxes=np.empty((0, 4), dtype=np.int32),
+            confidences=np.empty(0),
+            ages=np.empty(0, dtype=np.int32),
+            age_confidences=np.empty(0),
+            races=[],
+            race_confidences=np.empty(0),
+            emotions=[],
+            emotion_confidences=np.empty(0),
+            landmark_counts=np.empty(0, dtype=np.int32),
+        )
+
+def bbox_iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    """Intersection-over-union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+@lru_cache(maxsize=1024)
+def label_width(text: str) -> int:
+    """Pixel width of a label line drawn by draw_analysis_results"""
+    return cv2.getTextSize(text, LABEL_FONT, LABEL_FONT_SCALE, LABEL_THICKNESS)[0][0]
+
+def jpeg_exif_orientation(data: bytes) -> int:
+    """EXIF orientation (1-8) of a JPEG, read from its APP1 segment; 1 when absent"""
+    offset = 2
+    while offset + 4 <= len(data) and data[offset] == 0xFF:
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker in (0xDA, 0xD9):
+            # Start of scan / end of image: no metadata after this
+            break
+        length = int.from_bytes(data[offset + 2:offset + 4], "big")
+        if marker == 0xE1 and data[offset + 4:offset + 10] == b"Exif\0\0":
+            tiff = data[offset + 10:offset + 2 + length]
+            order = {b"II": "little", b"MM": "big"}.get(tiff[:2])
+            if order is None or len(tiff) < 8:
+                return 1
+            ifd = int.from_bytes(tiff[4:8], order)
+            count = int.from_bytes(tiff[ifd:ifd + 2], order)
+            for entry in range(ifd + 2, min(ifd + 2 + 12 * count, len(tiff) - 11), 12):
+                if int.from_bytes(tiff[entry:entry + 2], order) == 0x0112:
+                    return int.from_bytes(tiff[entry + 8:entry + 10], order)
+            return 1
+        offset += 2 + length
+    return 1
 
 class FaceAnalyzer:
     """Comprehensive face analyzer using HuggingFace models and MediaPipe"""
     
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(self, video_mode: bool = False, device: Optional[str] = None):
+        import torch
+        import mediapipe as mp
+        
+        self.video_mode = video_mode
+        # device: a torch device string such as "cuda:1"; default picks CUDA when available
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.device_type = torch.device(self.device).type
         logger.info(f"Using device: {self.device}")
         
-        # Initialize MediaPipe Face Detection
+        # PyTorch's default intra-op thread count is conservative; use all cores
+        # (divided between workers) and keep the inter-op pool small
+        if self.device_type == "cpu":
+            torch.set_num_threads(cpu_threads_per_worker())
+            try:
+                torch.set_num_interop_threads(2)
+            except RuntimeError:
+                # Can only be set once, before any inter-op work has started
+                pass
+            logger.info(f"Using {torch.get_num_threads()} CPU threads")
+        
+        # Inference backend: "pytorch" (default), "onnx" (ONNX Runtime via optimum)
+        # or "trt" (TensorRT FP16 engines built by build_engine.py, CUDA only)
+        self.backend = os.environ.get("SFA_BACKEND", "pytorch").lower()
+        if self.backend == "onnx" and importlib.util.find_spec("optimum") is None:
+            logger.warning("SFA_BACKEND=onnx but optimum is not installed, using PyTorch")
+            self.backend = "pytorch"
+        if self.backend == "trt" and (self.device_type != "cuda" or importlib.util.find_spec("tensorrt") is None):
+            logger.warning("SFA_BACKEND=trt needs CUDA and the tensorrt package, using PyTorch")
+            self.backend = "pytorch"
+        logger.info(f"Using inference backend: {self.backend}")
+        
+        # Half precision on GPU; bf16 on CPU only when requested (needs AVX512-BF16/AMX).
+        # ONNX graphs and TensorRT engine inputs are fp32, so PyTorch fallbacks stay in fp32 too.
+        cpu_precision = os.environ.get("SFA_CPU_PRECISION", "fp32").lower()
+        if self.backend in ("onnx", "trt"):
+            self.dtype = torch.float32
+        elif self.device_type == "cuda":
+            self.dtype = torch.float16
+        elif cpu_precision == "bf16":
+            self.dtype = torch.bfloat16
+        else:
+            self.dtype = torch.float32
+        logger.info(f"Using inference dtype: {self.dtype}")
+        
+        # Dynamic INT8 quantization of the Linear layers (QKV/FFN) for CPU inference
+        self.quantize_int8 = (
+            self.device_type == "cpu" and self.backend == "pytorch" and cpu_precision == "int8"
+        )
+        if self.quantize_int8:
+            logger.info("Using dynamic INT8 quantization")
+        
+        # torch.compile pays off mostly on CUDA (graph capture); opt in elsewhere
+        default_compile = "1" if self.device_type == "cuda" else "0"
+        self.use_torch_compile = (
+            os.environ.get("SFA_TORCH_COMPILE", default_compile) == "1"
+            and hasattr(torch, "compile")
+        )
+        
+        # MediaPipe Face Detection and Face Mesh for landmarks. The graphs run
+        # their own scheduler threads, which do not survive fork, so they are
+        # built on first use in each process (see mediapipe_graphs)
         self.mp_face_detection = mp.solutions.face_detection
         self.mp_drawing = mp.solutions.drawing_utils
-        self.face_detection = self.mp_face_detection.FaceDetection(
-            model_selection=1, min_detection_confidence=0.5)
-        
-        # Initialize Face Mesh for landmarks
         self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
+        self._pid = os.getpid()
+        self._graphs = None
+        self._executor = None
+        # Built on first analyze_video_frame call (or with the graphs in video_mode)
+        self._video_graphs = None
+        
+        # Set by _load_models for each classifier that loaded successfully
+        self.has_age_model = False
+        self.has_race_model = False
+        self.has_emotion_model = False
+        
+        # Backend each model actually loaded with (a failed ONNX/TensorRT load falls back to PyTorch)
+        self.model_backends: Dict[str, str] = {}
+        
+        # Shared-backbone age/race/emotion model, used instead of the three
+        # separate classifiers when SFA_MULTIHEAD_CHECKPOINT is set
+        self.multihead_model = None
+        
+        # Cached (scale, shift) normalization per classifier, taken from its processor
+        self._age_norm = None
+        self._race_norm = None
+        self._emotion_norm = None
+        
+        # nvJPEG decode via torchvision; disabled if torchvision lacks nvJPEG support
+        self._gpu_jpeg_decode = self.device_type == "cuda" and importlib.util.find_spec("torchvision") is not None
+        
+        # Pinned host staging buffer (and its copy-done event) for async H2D copies;
+        # one per analyzer, since inference only runs on its executor thread
+        self._staging = None
+        self._copy_done = None
+        
+        # Tracking state for analyze_video_frame
+        self._frame_idx = 0
+        self._last_results: List[FaceAnalysisResult] = []
+        
+        self._load_models()
+    
+    @classmethod
+    def preload_models(cls, device: Optional[str] = None) -> "FaceAnalyzer":
+        """Load the global analyzer for a device before workers fork so they share its weights
+        
+        CPU weights are moved to shared memory, so forked workers map the same
+        pages instead of each holding a private copy of every checkpoint. Only
+        weights are preloaded: MediaPipe graphs are built in each worker.
+        """
+        analyzer = get_face_analyzer(device)
+        if analyzer.device_type == "cpu":
+            for model in analyzer._torch_models():
+                model.share_memory()
+            logger.info("Model weights moved to shared memory")
+        return analyzer
+    
+    def _torch_models(self) -> List[torch.nn.Module]:
+        """All loaded PyTorch models (ONNX Runtime sessions are skipped)"""
+        import torch
+        models = [getattr(self, name, None) for name in
+                  ('age_model', 'race_model', 'emotion_model', 'multihead_model')]
+        return [model for model in models if isinstance(model, torch.nn.Module)]
+    
+    def _check_fork(self):
+        """Drop per-process state when running in a forked child (its threads are gone)"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._graphs = None
+            self._video_graphs = None
+            self._executor = None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Single thread that runs this analyzer's warm-up and inference
+        
+        torch.compile's reduce-overhead CUDA graphs are recorded per thread, so
+        requests only benefit from the warm-up if they run on the same thread.
+        """
+        self._check_fork()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sfa-{self.device}")
+        return self._executor
+    
+    def mediapipe_graphs(self):
+        """(face_detection, face_mesh) graphs of this process, built on first use"""
+        self._check_fork()
+        if self._graphs is None:
+            if self.video_mode:
+                self._graphs = self._video_graphs = self._create_video_graphs()
+            else:
+                self._graphs = self._create_image_graphs()
+        return self._graphs
+    
+    @property
+    def face_detection(self):
+        return self.mediapipe_graphs()[0]
+    
+    @property
+    def face_mesh(self):
+        return self.mediapipe_graphs()[1]
+    
+    def _create_image_graphs(self):
+        """Build MediaPipe graphs for independent still images"""
+        face_detection = self.mp_face_detection.FaceDetection(
+            model_selection=1, min_detection_confidence=0.5)
+        face_mesh = self.mp_face_mesh.FaceMesh(
             static_image_mode=True,
-            max_num_faces=1,
+            max_num_faces=MAX_FACES,
             refine_landmarks=True,
             min_detection_confidence=0.5)
-        
-        self._load_models()
+        return face_detection, face_mesh
+    
+    def _create_video_graphs(self):
+        """Build MediaPipe graphs tuned for consecutive frames of one stream"""
+        # Short-range detector is faster and suits close-up webcam input
+        face_detection = self.mp_face_detection.FaceDetection(
+            model_selection=0, min_detection_confidence=0.5)
+        # Tracking mode reuses the previous frame's landmarks; no iris refinement
+        face_mesh = self.mp_face_mesh.FaceMesh(
+            static_image_mode=False,
+            max_num_faces=4,
+            refine_landmarks=False,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5)
+        return face_detection, face_mesh
     
     def _load_models(self):
         """Load all HuggingFace models"""
         try:
+            from transformers import AutoProcessor
+            
             logger.info("Loading models from HuggingFace...")
             
             # Age estimation model - Using DEX (Deep EXpectation) approach
             logger.info("Loading age estimation model...")
             try:
-                self.age_model = AutoModelForImageClassification.from_pretrained(
-                    "nateraw/vit-age-classifier"
-                )
-                self.age_processor = AutoProcessor.from_pretrained(
-                    "nateraw/vit-age-classifier"
-                )
+                self.age_model = self._load_classifier(AGE_MODEL_NAME)
+                self.age_processor = AutoProcessor.from_pretrained(AGE_MODEL_NAME)
+                self._age_norm = self._normalization(self.age_processor)
+                self.has_age_model = True
                 logger.info("Age model loaded successfully!")
             except Exception as e:
                 logger.warning(f"Failed to load age model: {e}")
@@ -72,54 +382,224 @@ class FaceAnalyzer:
             # Emotion recognition model - Using a working vision model
             logger.info("Loading emotion recognition model...")
             try:
-                self.emotion_model = pipeline(
-                    "image-classification",
-                    model="trpakov/vit-face-expression",
-                    device=0 if torch.cuda.is_available() else -1
-                )
+                self.emotion_model = self._load_classifier(EMOTION_MODEL_NAME)
+                self.emotion_processor = AutoProcessor.from_pretrained(EMOTION_MODEL_NAME)
+                self._emotion_norm = self._normalization(self.emotion_processor)
+                id2label = self.emotion_model.config.id2label
+                self.emotion_labels = [id2label[i] for i in range(len(id2label))]
+                self.has_emotion_model = True
                 logger.info("Emotion model loaded successfully!")
             except Exception as e:
                 logger.warning(f"Failed to load emotion model: {e}")
-                try:
-                    # Fallback to another emotion model
-                    self.emotion_model = pipeline(
-                        "image-classification", 
-                        model="j-hartmann/emotion-english-distilroberta-base"
-                    )
-                    logger.info("Fallback emotion model loaded!")
-                except Exception as e2:
-                    logger.warning(f"Fallback emotion model also failed: {e2}")
             
             # Race/ethnicity classification 
             logger.info("Loading race classification model...")
             try:
-                self.race_model = AutoModelForImageClassification.from_pretrained(
-                    "rizvandwiki/gender-classification"
-                )
-                self.race_processor = AutoProcessor.from_pretrained(
-                    "rizvandwiki/gender-classification"
-                )
+                self.race_model = self._load_classifier(RACE_MODEL_NAME)
+                self.race_processor = AutoProcessor.from_pretrained(RACE_MODEL_NAME)
+                self._race_norm = self._normalization(self.race_processor)
+                self.has_race_model = True
                 logger.info("Race model loaded successfully!")
             except Exception as e:
                 logger.warning(f"Failed to load race model: {e}")
             
+            # Optional shared-backbone model distilled from the three classifiers above
+            multihead_checkpoint = os.environ.get("SFA_MULTIHEAD_CHECKPOINT")
+            if multihead_checkpoint and self.has_age_model:
+                logger.info("Loading multi-head face model...")
+                try:
+                    from multihead_vit import MultiHeadFaceViT
+                    multihead_model = MultiHeadFaceViT.load(Path(multihead_checkpoint))
+                    self.multihead_labels = multihead_model.labels
+                    self.multihead_model = self._optimize_model(multihead_model)
+                    self.model_backends["multihead"] = self._pytorch_backend_name
+                    logger.info("Multi-head model loaded successfully!")
+                except Exception as e:
+                    logger.warning(f"Failed to load multi-head model: {e}")
+            
             logger.info("Model loading completed!")
             
         except Exception as e:
             logger.error(f"Error in model loading process: {e}")
             # Continue with available models
     
-    def _load_fallback_models(self):
-        """Load simpler models as fallback"""
-        logger.info("Using fallback implementations...")
-        # Use MediaPipe and OpenCV-based analysis as fallback
-        logger.info("Fallback models ready (MediaPipe + OpenCV)")
+    def _load_classifier(self, model_name: str):
+        """Load an image classifier for the configured inference backend"""
+        from transformers import AutoModelForImageClassification
+        if self.backend == "onnx":
+            try:
+                model = self._load_onnx_classifier(model_name)
+                self.model_backends[model_name] = "onnxruntime"
+                return model
+            except Exception as e:
+                logger.warning(f"ONNX export of {model_name} failed, using PyTorch: {e}")
+        elif self.backend == "trt":
+            try:
+                model = self._load_trt_classifier(model_name)
+                self.model_backends[model_name] = "tensorrt-fp16"
+                return model
+            except Exception as e:
+                logger.warning(f"TensorRT engine for {model_name} unavailable, using PyTorch: {e}")
+        
+        model = AutoModelForImageClassification.from_pretrained(model_name)
+        model = self._optimize_model(model)
+        self.model_backends[model_name] = self._pytorch_backend_name
+        return model
+    
+    def _load_onnx_classifier(self, model_name: str):
+        """Load an ONNX Runtime classifier, exporting and caching it on first use"""
+        from optimum.onnxruntime import ORTModelForImageClassification
+        
+        provider = "CUDAExecutionProvider" if self.device_type == "cuda" else "CPUExecutionProvider"
+        provider_options = {"device_id": torch_device_index(self.device)} if self.device_type == "cuda" else None
+        export_dir = MODEL_CACHE_DIR / "onnx" / model_name.replace("/", "--")
+        
+        if (export_dir / "model.onnx").exists():
+            return ORTModelForImageClassification.from_pretrained(
+                export_dir, provider=provider, provider_options=provider_options)
+        
+        logger.info(f"Exporting {model_name} to ONNX (one-time)...")
+        model = ORTModelForImageClassification.from_pretrained(
+            model_name, export=True, provider=provider, provider_options=provider_options)
+        model.save_pretrained(export_dir)
+        return model
+    
+    def _load_trt_classifier(self, model_name: str):
+        """Load a TensorRT engine prebuilt by build_engine.py"""
+        from transformers import AutoConfig
+        from trt_runtime import TRTClassifier
+        
+        engine = trt_engine_path(model_name)
+        if not engine.exists():
+            raise FileNotFoundError(f"{engine} not found; run build_engine.py first")
+        return TRTClassifier(engine, AutoConfig.from_pretrained(model_name), device=self.device)
     
-    def detect_faces(self, image: np.ndarray) -> List[Dict]:
+    @property
+    def _pytorch_backend_name(self) -> str:
+        """Label of PyTorch inference at this analyzer's dtype, e.g. pytorch-float16"""
+        return f"pytorch-{str(self.dtype).replace('torch.', '')}"
+    
+    @property
+    def backend_name(self) -> str:
+        """Backends the models actually loaded with, e.g. tensorrt-fp16 or
+        "tensorrt-fp16, pytorch-float32" when some fell back to PyTorch"""
+        return ", ".join(dict.fromkeys(self.model_backends.values())) or self._pytorch_backend_name
+    
+    def _optimize_model(self, model):
+        """Move model to the inference device/dtype and compile it for low-overhead inference"""
+        import torch
+        model = model.to(self.device, dtype=self.dtype).eval()
+        if self.quantize_int8:
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8)
+        if not self.use_torch_compile:
+            return model
+        
+        try:
+            import torch._dynamo
+            compiled = torch.compile(model, mode="reduce-overhead", fullgraph=False)
+            
+            # Warm up so compilation happens at load time, not on the request path.
+            # Batch sizes vary (faces per image, micro-batched images), so dim 0 is
+            # compiled as dynamic: marked on a batch of 2 because dynamo always
+            # specializes size 1, which gets its own graph here too. Every size up
+            # to MAX_FACES then runs twice on CUDA so reduce-overhead records its
+            # per-size CUDA graph now; larger batches re-record but never recompile
+            # Runs on the inference thread, where requests replay the graphs
+            batch_sizes = [2, 1, *range(3, MAX_FACES + 1)]
+            passes = 2 if self.device_type == "cuda" else 1
+            
+            def warm_up():
+                with torch.inference_mode(), self._autocast():
+                    for i, batch_size in enumerate(batch_sizes * passes):
+                        dummy = torch.zeros(batch_size, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE,
+                                            device=self.device, dtype=self.dtype)
+                        if i == 0:
+                            torch._dynamo.mark_dynamic(dummy, 0)
+                        compiled(pixel_values=dummy)
+            
+            self.executor.submit(warm_up).result()
+            
+            logger.info(f"Compiled {model.__class__.__name__} with torch.compile")
+            return compiled
+        except Exception as e:
+            logger.warning(f"torch.compile failed, using eager model: {e}")
+            return model
+    
+    def _normalization(self, processor) -> Tuple[np.ndarray, np.ndarray]:
+        """Fold a processor's rescale + mean/std into one (scale, shift) pair"""
+        scale = np.full(3, processor.rescale_factor if processor.do_rescale else 1.0, dtype=np.float32)
+        shift = np.zeros(3, dtype=np.float32)
+        if processor.do_normalize:
+            mean = np.array(processor.image_mean, dtype=np.float32)
+            std = np.array(processor.image_std, dtype=np.float32)
+            scale /= std
+            shift = -mean / std
+        return scale, shift
+    
+    def _preprocess(self, face_images: List[np.ndarray], norm: Tuple[np.ndarray, np.ndarray]) -> torch.Tensor:
+        """Normalize 224x224 RGB face arrays into an NCHW pixel_values tensor"""
+        import torch
+        scale, shift = norm
+        batch = np.stack([np.asarray(face, dtype=np.float32) for face in face_images])
+        batch = batch * scale + shift
+        batch = batch.transpose(0, 3, 1, 2)
+        
+        n = len(face_images)
+        if self.device_type == "cuda" and n <= MAX_FACES:
+            # Stage in pinned memory so the H2D copy runs asynchronously
+            staging, copy_done = self._pinned_staging()
+            # The previous async copy out of this buffer must finish before we overwrite it
+            copy_done.synchronize()
+            np.copyto(staging[:n].numpy(), batch)
+            pixel_values = staging[:n].to(self.device, non_blocking=True)
+            copy_done.record(torch.cuda.current_stream(self.device))
+            return pixel_values.to(self.dtype)
+        
+        pixel_values = torch.from_numpy(np.ascontiguousarray(batch))
+        return pixel_values.to(self.device, dtype=self.dtype)
+    
+    def _pinned_staging(self) -> Tuple[torch.Tensor, "torch.cuda.Event"]:
+        """Pinned host buffer (and its copy-done event) for MAX_FACES faces, created on first use"""
+        import torch
+        if self._staging is None:
+            self._staging = torch.empty((MAX_FACES, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE),
+                                        dtype=torch.float32, pin_memory=True)
+            self._copy_done = torch.cuda.Event()
+        return self._staging, self._copy_done
+    
+    def _preprocess_shared(self, face_images: List[np.ndarray],
+                           norms: List[Optional[Tuple[np.ndarray, np.ndarray]]]) -> List[Optional[torch.Tensor]]:
+        """Preprocess faces for several models, reusing tensors between identical norms"""
+        cache = []
+        pixel_values = []
+        for norm in norms:
+            tensor = None
+            if norm is not None:
+                for cached_norm, cached_tensor in cache:
+                    if all(np.allclose(a, b) for a, b in zip(cached_norm, norm)):
+                        tensor = cached_tensor
+                        break
+                else:
+                    tensor = self._preprocess(face_images, norm)
+                    cache.append((norm, tensor))
+            pixel_values.append(tensor)
+        return pixel_values
+    
+    def _autocast(self):
+        """Autocast context for CPU bf16 inference (no-op otherwise)"""
+        import torch
+        if self.device_type == "cpu" and self.dtype == torch.bfloat16:
+            return torch.cpu.amp.autocast(dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+    
+    def detect_faces(self, image: np.ndarray, rgb_image: np.ndarray = None,
+                     face_detection=None) -> List[Dict]:
         """Detect faces using MediaPipe"""
         try:
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            results = self.face_detection.process(rgb_image)
+            if rgb_image is None:
+                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            results = (face_detection or self.face_detection).process(rgb_image)
             
             faces = []
             if results.detections:
@@ -143,127 +623,161 @@ class FaceAnalyzer:
             logger.error(f"Error in face detection: {e}")
             return []
     
-    def get_face_landmarks(self, image: np.ndarray) -> List[Tuple[int, int]]:
-        """Extract face landmarks using MediaPipe Face Mesh"""
+    def get_face_landmarks(self, image: np.ndarray, rgb_image: np.ndarray = None) -> np.ndarray:
+        """Extract face landmarks using MediaPipe Face Mesh as an (N, 2) int32 array"""
+        meshes = self._get_face_meshes(image, rgb_image)
+        return np.concatenate(meshes) if meshes else np.empty((0, 2), dtype=np.int32)
+    
+    def _get_face_meshes(self, image: np.ndarray, rgb_image: np.ndarray = None,
+                         face_mesh=None) -> List[np.ndarray]:
+        """Run Face Mesh once and return one (K, 2) landmark array per detected face"""
         try:
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            results = self.face_mesh.process(rgb_image)
+            if rgb_image is None:
+                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            results = (face_mesh or self.face_mesh).process(rgb_image)
             
-            landmarks = []
+            meshes = []
             if results.multi_face_landmarks:
                 h, w, _ = image.shape
+                scale = np.array([w, h], dtype=np.float32)
                 for face_landmarks in results.multi_face_landmarks:
-                    for landmark in face_landmarks.landmark:
-                        x = int(landmark.x * w)
-                        y = int(landmark.y * h)
-                        landmarks.append((x, y))
+                    # Normalized -> pixel coordinates in one vectorized step
+                    points = np.array([(lm.x, lm.y) for lm in face_landmarks.landmark], dtype=np.float32)
+                    points *= scale
+                    meshes.append(points.astype(np.int32))
             
-            return landmarks
+            return meshes
         except Exception as e:
             logger.error(f"Error extracting landmarks: {e}")
             return []
     
-    def estimate_age(self, face_image: Image.Image) -> Tuple[int, float]:
+    def _match_landmarks(self, faces: List[Dict], meshes: List[np.ndarray]) -> List[np.ndarray]:
+        """Assign each detected face the mesh whose centroid is closest to its bbox center"""
+        matched = [np.empty((0, 2), dtype=np.int32) for _ in faces]
+        if not meshes:
+            return matched
+        
+        centroids = np.array([mesh.mean(axis=0) for mesh in meshes])
+        available = set(range(len(meshes)))
+        for i, face_data in enumerate(faces):
+            if not available:
+                break
+            x, y, w, h = face_data['bbox']
+            center = np.array([x + w / 2, y + h / 2])
+            nearest = min(available, key=lambda j: np.linalg.norm(centroids[j] - center))
+            matched[i] = meshes[nearest]
+            available.remove(nearest)
+        
+        return matched
+    
+    def _ages_from_predictions(self, predictions: torch.Tensor) -> List[Tuple[int, float]]:
+        """Convert age class probabilities to (age, confidence) pairs"""
+        # Get predicted age (this is model-specific)
+        confidences, predicted_ages = predictions.max(dim=-1)
+        return list(zip(predicted_ages.tolist(), confidences.tolist()))
+    
+    def _races_from_predictions(self, predictions: torch.Tensor) -> List[Tuple[str, float]]:
+        """Convert race class probabilities to (race, confidence) pairs"""
+        confidences, predicted_idx = predictions.max(dim=-1)
+        return [
+            (RACE_CATEGORIES[idx % len(RACE_CATEGORIES)], confidence)
+            for idx, confidence in zip(predicted_idx.tolist(), confidences.tolist())
+        ]
+    
+    def _emotions_from_predictions(self, predictions: torch.Tensor,
+                                   labels: List[str]) -> List[Tuple[str, float]]:
+        """Convert emotion class probabilities to (emotion, confidence) pairs"""
+        confidences, predicted_idx = predictions.max(dim=-1)
+        return [
+            (EMOTION_LABEL_MAPPING.get(labels[idx].upper(), labels[idx]), confidence)
+            for idx, confidence in zip(predicted_idx.tolist(), confidences.tolist())
+        ]
+    
+    def _batch_multihead(self, face_images: List[np.ndarray]) -> Tuple[List, List, List]:
+        """Run age, race and emotion heads over one shared backbone forward"""
+        import torch
+        pixel_values = self._preprocess(face_images, self._age_norm)
+        with torch.inference_mode(), self._autocast():
+            age_logits, race_logits, emotion_logits = self.multihead_model(pixel_values=pixel_values)
+        
+        return (
+            self._ages_from_predictions(age_logits.float().softmax(dim=-1)),
+            self._races_from_predictions(race_logits.float().softmax(dim=-1)),
+            self._emotions_from_predictions(emotion_logits.float().softmax(dim=-1),
+                                            self.multihead_labels["emotion"]),
+        )
+    
+    def estimate_age(self, face_image: np.ndarray) -> Tuple[int, float]:
         """Estimate age using HuggingFace model"""
-        try:
-            if hasattr(self, 'age_processor') and hasattr(self, 'age_model'):
-                inputs = self.age_processor(face_image, return_tensors="pt")
-                with torch.no_grad():
-                    outputs = self.age_model(**inputs)
-                    predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-                    
-                # Get predicted age (this is model-specific)
-                age_classes = list(range(0, 101))  # 0-100 years
-                predicted_age = torch.argmax(predictions, dim=-1).item()
-                confidence = torch.max(predictions).item()
-                
-                return predicted_age, confidence
-            else:
-                # Fallback age estimation
-                return self._fallback_age_estimation(face_image)
-                
-        except Exception as e:
-            logger.error(f"Error in age estimation: {e}")
-            return self._fallback_age_estimation(face_image)
-    
-    def _fallback_age_estimation(self, face_image: Image.Image) -> Tuple[int, float]:
-        """Fallback age estimation based on image characteristics"""
-        # Simple heuristic based on image analysis
-        # This is a placeholder - in real implementation, you'd use proper model
-        import random
-        age = random.randint(18, 65)
-        confidence = 0.5
-        return age, confidence
-    
-    def classify_race(self, face_image: Image.Image) -> Tuple[str, float]:
+        return self._batch_estimate_age([face_image])[0]
+    
+    def _batch_estimate_age(self, face_images: List[np.ndarray],
+                            pixel_values: torch.Tensor = None) -> List[Tuple[int, float]]:
+        """Estimate age for a batch of faces with a single forward pass"""
+        import torch
+        if not self.has_age_model:
+            raise ModelUnavailableError("Age model is not loaded")
+        
+        if pixel_values is None:
+            pixel_values = self._preprocess(face_images, self._age_norm)
+        with torch.inference_mode(), self._autocast():
+            outputs = self.age_model(pixel_values=pixel_values)
+            predictions = outputs.logits.float().softmax(dim=-1)
+        
+        return self._ages_from_predictions(predictions)
+    
+    def classify_race(self, face_image: np.ndarray) -> Tuple[str, float]:
         """Classify race/ethnicity"""
-        try:
-            if hasattr(self, 'race_processor') and hasattr(self, 'race_model'):
-                inputs = self.race_processor(face_image, return_tensors="pt")
-                with torch.no_grad():
-                    outputs = self.race_model(**inputs)
-                    predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-                    
-                # Race categories (adjust based on model)
-                race_categories = ["Asian", "Black", "Indian", "White", "Middle Eastern"]
-                predicted_idx = torch.argmax(predictions, dim=-1).item()
-                confidence = torch.max(predictions).item()
-                
-                race = race_categories[predicted_idx % len(race_categories)]
-                return race, confidence
-            else:
-                return self._fallback_race_classification()
-                
-        except Exception as e:
-            logger.error(f"Error in race classification: {e}")
-            return self._fallback_race_classification()
+        return self._batch_classify_race([face_image])[0]
     
-    def _fallback_race_classification(self) -> Tuple[str, float]:
-        """Fallback race classification"""
-        import random
-        races = ["Asian", "Black", "Indian", "White", "Middle Eastern", "Mixed", "Other"]
-        return random.choice(races), 0.5
+    def _batch_classify_race(self, face_images: List[np.ndarray],
+                             pixel_values: torch.Tensor = None) -> List[Tuple[str, float]]:
+        """Classify race/ethnicity for a batch of faces with a single forward pass"""
+        import torch
+        if not self.has_race_model:
+            raise ModelUnavailableError("Race model is not loaded")
+        
+        if pixel_values is None:
+            pixel_values = self._preprocess(face_images, self._race_norm)
+        with torch.inference_mode(), self._autocast():
+            outputs = self.race_model(pixel_values=pixel_values)
+            predictions = outputs.logits.float().softmax(dim=-1)
+        
+        return self._races_from_predictions(predictions)
     
-    def detect_emotion(self, face_image: Image.Image) -> Tuple[str, float]:
+    def detect_emotion(self, face_image: np.ndarray) -> Tuple[str, float]:
         """Detect emotion using HuggingFace model"""
-        try:
-            if hasattr(self, 'emotion_model'):
-                # Convert PIL image to format expected by model
-                results = self.emotion_model(face_image)
-                
-                if results:
-                    top_result = results[0]
-                    emotion = top_result['label']
-                    confidence = top_result['score']
-                    
-                    # Map model labels to standard emotion categories
-                    emotion_mapping = {
-                        'HAPPY': 'Happy',
-                        'SAD': 'Sad', 
-                        'ANGRY': 'Angry',
-                        'FEAR': 'Fear',
-                        'SURPRISE': 'Surprise',
-                        'DISGUST': 'Disgust',
-                        'NEUTRAL': 'Neutral'
-                    }
-                    
-                    mapped_emotion = emotion_mapping.get(emotion.upper(), emotion)
-                    return mapped_emotion, confidence
-                    
-        except Exception as e:
-            logger.error(f"Error in emotion detection: {e}")
+        return self._batch_detect_emotion([face_image])[0]
+    
+    def _batch_detect_emotion(self, face_images: List[np.ndarray],
+                              pixel_values: torch.Tensor = None) -> List[Tuple[str, float]]:
+        """Detect emotion for a batch of faces with a single forward pass"""
+        import torch
+        if not self.has_emotion_model:
+            raise ModelUnavailableError("Emotion model is not loaded")
         
-        return self._fallback_emotion_detection()
+        if pixel_values is None:
+            pixel_values = self._preprocess(face_images, self._emotion_norm)
+        with torch.inference_mode(), self._autocast():
+            outputs = self.emotion_model(pixel_values=pixel_values)
+            predictions = outputs.logits.float().softmax(dim=-1)
+        
+        return self._emotions_from_predictions(predictions, self.emotion_labels)
     
-    def _fallback_emotion_detection(self) -> Tuple[str, float]:
-        """Fallback emotion detection"""
-        import random
-        emotions = ["Happy", "Sad", "Angry", "Fear", "Surprise", "Disgust", "Neutral"]
-        return random.choice(emotions), 0.5
+    def _predict_or_unknown(self, predict, face_images: List[np.ndarray],
+                            pixel_values: Optional[torch.Tensor], unknown: Tuple) -> List[Tuple]:
+        """Run one batched classifier, marking every face unknown if it is unavailable or fails"""
+        try:
+            return predict(face_images, pixel_values)
+        except ModelUnavailableError as e:
+            logger.warning(str(e))
+        except Exception as e:
+            logger.error(f"Error in {predict.__name__}: {e}")
+        return [unknown] * len(face_images)
     
     def crop_face(self, image: np.ndarray, bbox: Tuple[int, int, int, int], 
-                  padding: float = 0.2) -> Image.Image:
-        """Crop face from image with padding"""
+                  padding: float = 0.2, rgb_image: np.ndarray = None) -> np.ndarray:
+        """Crop face from image with padding as a 224x224 RGB array (sliced from rgb_image when given)"""
         x, y, w, h = bbox
         
         # Add padding
@@ -276,83 +790,289 @@ class FaceAnalyzer:
         x2 = min(image.shape[1], x + w + pad_w)
         y2 = min(image.shape[0], y + h + pad_h)
         
-        # Crop face
-        face_crop = image[y1:y2, x1:x2]
+        # Crop face; slicing the already-converted RGB frame avoids a per-face cvtColor
+        if rgb_image is not None:
+            face_crop = rgb_image[y1:y2, x1:x2]
+        else:
+            face_crop = cv2.cvtColor(image[y1:y2, x1:x2], cv2.COLOR_BGR2RGB)
         
-        # Convert to PIL Image
-        face_pil = Image.fromarray(cv2.cvtColor(face_crop, cv2.COLOR_BGR2RGB))
+        # Resize to standard size for model input; INTER_AREA when shrinking,
+        # INTER_LINEAR when enlarging (INTER_AREA degrades to nearest-neighbour there)
+        shrinking = face_crop.shape[0] >= MODEL_INPUT_SIZE and face_crop.shape[1] >= MODEL_INPUT_SIZE
+        interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+        return cv2.resize(face_crop, (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE), interpolation=interpolation)
+    
+    def _classify_faces(self, face_images: List[np.ndarray]) -> Tuple[List, List, List]:
+        """Run age, race and emotion classification over a batch of face crops"""
+        if self.multihead_model is not None:
+            return self._batch_multihead(face_images)
         
-        # Resize to standard size for model input
-        face_pil = face_pil.resize((224, 224))
+        # Stock ViT processors share normalization: preprocess once per distinct norm
+        age_pixels, race_pixels, emotion_pixels = self._preprocess_shared(
+            face_images, [self._age_norm, self._race_norm, self._emotion_norm])
         
-        return face_pil
+        ages = self._predict_or_unknown(self._batch_estimate_age, face_images, age_pixels, UNKNOWN_AGE)
+        races = self._predict_or_unknown(self._batch_classify_race, face_images, race_pixels, UNKNOWN_LABEL)
+        emotions = self._predict_or_unknown(self._batch_detect_emotion, face_images, emotion_pixels, UNKNOWN_LABEL)
+        return ages, races, emotions
     
-    def analyze_image(self, image: np.ndarray) -> List[FaceAnalysisResult]:
+    def _build_results(self, faces: List[Dict], face_landmarks: List, ages: List,
+                       races: List, emotions: List) -> List[FaceAnalysisResult]:
+        """Zip per-face detections and predictions into FaceAnalysisResult objects"""
+        results = []
+        for face_data, landmarks, (age, age_conf), (race, race_conf), (emotion, emotion_conf) in zip(
+                faces, face_landmarks, ages, races, emotions):
+            # Create result
+            result = FaceAnalysisResult(
+                face_detected=True,
+                confidence=face_data['confidence'],
+                bbox=face_data['bbox'],
+                age=age,
+                age_confidence=age_conf,
+                race=race,
+                race_confidence=race_conf,
+                emotion=emotion,
+                emotion_confidence=emotion_conf,
+                landmarks=landmarks[:RESULT_LANDMARKS]
+            )
+            
+            results.append(result)
+        
+        return results
+    
+    def _build_batch_result(self, faces: List[Dict], face_landmarks: List, ages: List,
+                            races: List, emotions: List) -> FaceBatchResult:
+        """Pack per-face detections and predictions into a FaceBatchResult"""
+        age_values, age_confidences = zip(*ages)
+        race_labels, race_confidences = zip(*races)
+        emotion_labels, emotion_confidences = zip(*emotions)
+        return FaceBatchResult(
+            bboxes=np.array([face_data['bbox'] for face_data in faces], dtype=np.int32),
+            confidences=np.array([face_data['confidence'] for face_data in faces]),
+            ages=np.array(age_values, dtype=np.int32),
+            age_confidences=np.array(age_confidences),
+            races=list(race_labels),
+            race_confidences=np.array(race_confidences),
+            emotions=list(emotion_labels),
+            emotion_confidences=np.array(emotion_confidences),
+            landmark_counts=np.array([min(len(landmarks), RESULT_LANDMARKS)
+                                      for landmarks in face_landmarks], dtype=np.int32),
+        )
+    
+    def analyze_image(self, image: np.ndarray, rgb_image: np.ndarray = None) -> List[FaceAnalysisResult]:
         """Perform complete face analysis on image"""
         results = []
         
         try:
+            # Convert once; detection and Face Mesh both consume RGB
+            if rgb_image is None:
+                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            
             # Detect faces
-            faces = self.detect_faces(image)
+            faces = self.detect_faces(image, rgb_image)
             
             if not faces:
                 logger.info("No faces detected in image")
                 return results
             
-            # Analyze each detected face
-            for face_data in faces:
-                bbox = face_data['bbox']
-                confidence = face_data['confidence']
-                
-                # Crop face for analysis
-                face_image = self.crop_face(image, bbox)
-                
-                # Get landmarks
-                landmarks = self.get_face_landmarks(image)
+            # Crop all faces up front so each model runs once over the whole batch
+            face_images = [self.crop_face(image, face_data['bbox'], rgb_image=rgb_image)
+                           for face_data in faces]
+            
+            # Perform batched analysis
+            ages, races, emotions = self._classify_faces(face_images)
+            
+            # Get landmarks: one Face Mesh pass for the whole image
+            face_landmarks = self._match_landmarks(faces, self._get_face_meshes(image, rgb_image))
+            
+            results = self._build_results(faces, face_landmarks, ages, races, emotions)
                 
-                # Perform analysis
-                age, age_conf = self.estimate_age(face_image)
-                race, race_conf = self.classify_race(face_image)
-                emotion, emotion_conf = self.detect_emotion(face_image)
+        except Exception as e:
+            logger.error(f"Error in image analysis: {e}")
+        
+        return results
+    
+    def analyze_batch(self, images: List[np.ndarray],
+                      rgb_images: Optional[List[Optional[np.ndarray]]] = None) -> List[FaceBatchResult]:
+        """Analyze several images, classifying the faces of all of them in one batch"""
+        if rgb_images is None:
+            rgb_images = [None] * len(images)
+        
+        batch_results = [FaceBatchResult.empty() for _ in images]
+        
+        try:
+            # Detect, crop and mesh per image; remember which faces came from where
+            detections = []
+            face_images = []
+            for i, (image, rgb_image) in enumerate(zip(images, rgb_images)):
+                if rgb_image is None:
+                    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
                 
-                # Create result
-                result = FaceAnalysisResult(
-                    face_detected=True,
-                    confidence=confidence,
-                    bbox=bbox,
-                    age=age,
-                    age_confidence=age_conf,
-                    race=race,
-                    race_confidence=race_conf,
-                    emotion=emotion,
-                    emotion_confidence=emotion_conf,
-                    landmarks=landmarks[:10] if landmarks else []  # First 10 landmarks
-                )
+                faces = self.detect_faces(image, rgb_image)
+                if not faces:
+                    continue
                 
-                results.append(result)
+                face_images.extend(self.crop_face(image, face_data['bbox'], rgb_image=rgb_image)
+                                   for face_data in faces)
+                face_landmarks = self._match_landmarks(faces, self._get_face_meshes(image, rgb_image))
+                detections.append((i, faces, face_landmarks))
+            
+            if not face_images:
+                return batch_results
+            
+            # One classification pass over the faces of every image
+            ages, races, emotions = self._classify_faces(face_images)
+            
+            start = 0
+            for i, faces, face_landmarks in detections:
+                end = start + len(faces)
+                batch_results[i] = self._build_batch_result(faces, face_landmarks, ages[start:end],
+                                                            races[start:end], emotions[start:end])
+                start = end
                 
         except Exception as e:
-            logger.error(f"Error in image analysis: {e}")
+            logger.error(f"Error in batch analysis: {e}")
         
-        return results
+        return batch_results
+    
+    def analyze_video_frame(self, frame: np.ndarray) -> List[FaceAnalysisResult]:
+        """Analyze one frame of a video stream, reusing work from previous frames
+        
+        Face detection and Face Mesh only run every DETECTION_INTERVAL frames; in
+        between, the previous boxes are re-cropped. Age and race change slowly, so
+        they are carried over from the previous frame and only emotion is
+        re-classified, unless a fresh detection no longer overlaps a tracked face.
+        """
+        try:
+            # Stateful tracking graphs must only ever see frames of this stream
+            self._check_fork()
+            if self._video_graphs is None:
+                self._video_graphs = self._create_video_graphs()
+            face_detection, face_mesh = self._video_graphs
+            
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            detect = self._frame_idx % DETECTION_INTERVAL == 0 or not self._last_results
+            self._frame_idx += 1
+            
+            if detect:
+                faces = self.detect_faces(frame, rgb_frame, face_detection)
+            else:
+                faces = [{'bbox': r.bbox, 'confidence': r.confidence} for r in self._last_results]
+            
+            if not faces:
+                self._last_results = []
+                return []
+            
+            face_images = [self.crop_face(frame, face_data['bbox'], rgb_image=rgb_frame)
+                           for face_data in faces]
+            
+            # Match each face to the tracked result it overlaps most
+            tracked = []
+            for face_data in faces:
+                best = max(self._last_results, default=None,
+                           key=lambda r: bbox_iou(r.bbox, face_data['bbox']))
+                if best is not None and bbox_iou(best.bbox, face_data['bbox']) >= TRACKING_IOU_THRESHOLD:
+                    tracked.append(best)
+                else:
+                    tracked.append(None)
+            
+            if any(t is None for t in tracked) or self.multihead_model is not None:
+                ages, races, emotions = self._classify_faces(face_images)
+            else:
+                ages = [(t.age, t.age_confidence) for t in tracked]
+                races = [(t.race, t.race_confidence) for t in tracked]
+                emotions = self._predict_or_unknown(self._batch_detect_emotion, face_images, None, UNKNOWN_LABEL)
+            
+            if detect:
+                face_landmarks = self._match_landmarks(
+                    faces, self._get_face_meshes(frame, rgb_frame, face_mesh))
+            else:
+                face_landmarks = [t.landmarks for t in tracked]
+            
+            self._last_results = self._build_results(faces, face_landmarks, ages, races, emotions)
+            return self._last_results
+            
+        except Exception as e:
+            logger.error(f"Error in video frame analysis: {e}")
+            return []
     
     def analyze_image_from_bytes(self, image_bytes: bytes) -> List[FaceAnalysisResult]:
         """Analyze image from bytes"""
         try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            image, rgb_image = self.decode_image(image_bytes)
             
             if image is None:
                 logger.error("Failed to decode image")
                 return []
             
-            return self.analyze_image(image)
+            return self.analyze_image(image, rgb_image)
             
         except Exception as e:
             logger.error(f"Error analyzing image from bytes: {e}")
             return []
     
+    def decode_image(self, image_bytes: bytes) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Decode image bytes to (bgr, rgb); rgb is None when decoded by OpenCV, both None on failure"""
+        # JPEG on CUDA: decode with nvJPEG, skipping the CPU entropy decode.
+        # nvJPEG ignores EXIF orientation (cv2.imdecode applies it), so rotated
+        # photos go through OpenCV to get the same pixels on every device
+        if (self._gpu_jpeg_decode and image_bytes[:2] == b'\xff\xd8'
+                and jpeg_exif_orientation(image_bytes) == 1):
+            rgb_image = self._decode_jpeg_gpu(image_bytes)
+            if rgb_image is not None:
+                return cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR), rgb_image
+        
+        try:
+            # Convert bytes to numpy array
+            nparr = np.frombuffer(image_bytes, np.uint8)
+            return cv2.imdecode(nparr, cv2.IMREAD_COLOR), None
+        except Exception as e:
+            logger.error(f"Error decoding image: {e}")
+            return None, None
+    
+    def decode_base64_image(self, base64_string: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Decode a base64 image (optionally a data URL) like decode_image"""
+        try:
+            # Remove data URL prefix if present
+            if base64_string.startswith('data:image'):
+                base64_string = base64_string.split(',')[1]
+            
+            return self.decode_image(base64.b64decode(base64_string))
+            
+        except Exception as e:
+            logger.error(f"Error decoding base64 image: {e}")
+            return None, None
+    
+    def _decode_jpeg_gpu(self, image_bytes: bytes) -> Optional[np.ndarray]:
+        """Decode a JPEG on the GPU with torchvision and return an HWC RGB array
+        
+        Returns None when this image should be decoded by OpenCV instead.
+        """
+        try:
+            import torch
+            from torchvision.io import ImageReadMode, decode_jpeg
+        except ImportError as e:
+            logger.warning(f"GPU JPEG decode unavailable, using OpenCV: {e}")
+            self._gpu_jpeg_decode = False
+            return None
+        
+        try:
+            data = torch.frombuffer(bytearray(image_bytes), dtype=torch.uint8)
+            decoded = decode_jpeg(data, mode=ImageReadMode.RGB, device=self.device)
+        except Exception as e:
+            # TypeError: torchvision too old for device=; NotImplementedError or
+            # "not compiled with nvJPEG support": no GPU decoder in this build
+            if isinstance(e, (TypeError, NotImplementedError)) or "not compiled" in str(e):
+                logger.warning(f"GPU JPEG decode unavailable, using OpenCV: {e}")
+                self._gpu_jpeg_decode = False
+            else:
+                # Truncated/progressive/CMYK JPEGs nvJPEG rejects: only this image falls back
+                logger.debug(f"GPU JPEG decode failed, using OpenCV for this image: {e}")
+            return None
+        
+        # MediaPipe runs on the CPU, so bring the decoded pixels back once
+        return decoded.permute(1, 2, 0).contiguous().cpu().numpy()
+    
     def analyze_image_from_base64(self, base64_string: str) -> List[FaceAnalysisResult]:
         """Analyze image from base64 string"""
         try:
@@ -370,9 +1090,12 @@ class FaceAnalyzer:
             return []
     
     def draw_analysis_results(self, image: np.ndarray, 
-                            results: List[FaceAnalysisResult]) -> np.ndarray:
-        """Draw analysis results on image"""
-        annotated_image = image.copy()
+                            results: List[FaceAnalysisResult],
+                            inplace: bool = False) -> np.ndarray:
+        """Draw analysis results on image (on the image itself when inplace=True)"""
+        annotated_image = image if inplace else image.copy()
+        
+        font, font_scale, thickness = LABEL_FONT, LABEL_FONT_SCALE, LABEL_THICKNESS
         
         for result in results:
             if result.face_detected:
@@ -386,37 +1109,67 @@ class FaceAnalyzer:
                 race_text = f"Race: {result.race}"
                 emotion_text = f"Emotion: {result.emotion}"
                 
-                # Draw text background
-                font = cv2.FONT_HERSHEY_SIMPLEX
-                font_scale = 0.6
-                thickness = 1
-                
-                # Calculate text sizes
-                (text_w1, text_h1), _ = cv2.getTextSize(info_text, font, font_scale, thickness)
-                (text_w2, text_h2), _ = cv2.getTextSize(race_text, font, font_scale, thickness)
-                (text_w3, text_h3), _ = cv2.getTextSize(emotion_text, font, font_scale, thickness)
+                # Calculate widest text line (each label is measured once, then cached)
+                text_w = max(label_width(info_text), label_width(race_text), label_width(emotion_text))
                 
                 # Draw background rectangles
-                cv2.rectangle(annotated_image, (x, y - 80), (x + max(text_w1, text_w2, text_w3) + 10, y), (0, 0, 0), -1)
+                cv2.rectangle(annotated_image, (x, y - 80), (x + text_w + 10, y), (0, 0, 0), -1)
                 
                 # Draw text
                 cv2.putText(annotated_image, info_text, (x + 5, y - 60), font, font_scale, (255, 255, 255), thickness)
                 cv2.putText(annotated_image, race_text, (x + 5, y - 40), font, font_scale, (255, 255, 255), thickness)
                 cv2.putText(annotated_image, emotion_text, (x + 5, y - 20), font, font_scale, (255, 255, 255), thickness)
                 
-                # Draw some landmarks if available
-                if result.landmarks:
-                    for landmark in result.landmarks[:5]:  # Draw first 5 landmarks
-                        cv2.circle(annotated_image, landmark, 2, (255, 0, 0), -1)
+                # Draw some landmarks if available: one polylines call, each
+                # point a closed single-vertex polyline whose zero-length segment
+                # is drawn with round caps (same pixels as a radius-2 filled circle;
+                # an open single-vertex polyline draws nothing)
+                if len(result.landmarks):
+                    points = result.landmarks[:5].reshape(-1, 1, 2)  # First 5 landmarks
+                    cv2.polylines(annotated_image, list(points), True, (255, 0, 0), 4)
         
         return annotated_image
 
-# Global analyzer instance
-face_analyzer = None
+# Global analyzer instances, keyed by requested device (None = auto-selected)
+face_analyzers: Dict[Optional[str], "FaceAnalyzer"] = {}
+
+def trt_engine_path(model_name: str) -> Path:
+    """Where build_engine.py writes the TensorRT engine for a model"""
+    return MODEL_CACHE_DIR / "trt" / f"{model_name.replace('/', '--')}.plan"
+
+def torch_device_index(device: str) -> int:
+    """Index of a "cuda:N" device string (0 when not given)"""
+    _, _, index = device.partition(":")
+    return int(index) if index else 0
+
+def available_devices() -> List[Optional[str]]:
+    """Devices to run analyzers on, from SFA_DEVICES (e.g. "cuda:0,cuda:1,cpu")
+    
+    Returns [None] (one auto-selected device) when SFA_DEVICES is unset.
+    """
+    devices = []
+    for device in os.environ.get("SFA_DEVICES", "").split(","):
+        device = device.strip().lower()
+        if not device:
+            continue
+        if device.partition(":")[0] not in ("cpu", "cuda"):
+            logger.warning(f"Ignoring unsupported device in SFA_DEVICES: {device}")
+            continue
+        # A repeated device would put the same analyzer in the pool twice
+        if device in devices:
+            logger.warning(f"Ignoring repeated device in SFA_DEVICES: {device}")
+            continue
+        devices.append(device)
+    return devices or [None]
+
+def configure_torch_precision():
+    """Allow TF32 tensor-core matmuls for fp32 models and let cuDNN autotune convolutions"""
+    import torch
+    torch.set_float32_matmul_precision('high')
+    torch.backends.cudnn.benchmark = True
 
-def get_face_analyzer():
-    """Get global face analyzer instance"""
-    global face_analyzer
-    if face_analyzer is None:
-        face_analyzer = FaceAnalyzer()
-    return face_analyzer
\ No newline at end of file
+def get_face_analyzer(device: Optional[str] = None):
+    """Get global face analyzer instance for a device"""
+    if device not in face_analyzers:
+        face_analyzers[device] = FaceAnalyzer(device=device)
+    return face_analyzers[device]
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Gunicorn settings for running the API with several uvicorn worker processes.
+
+    cd backend
+    gunicorn server:app -c gunicorn.conf.py
+"""
+
+import multiprocessing
+import os
+import shutil
+
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+# Model loading and the first (compiled) forward pass can take a while
+timeout = 180
+
+# GPUs to spread the workers over, one per worker, round-robin
+worker_gpus = [gpu.strip() for gpu in os.environ.get("CUDA_VISIBLE_DEVICES", "").split(",") if gpu.strip()]
+# With SFA_DEVICES set every worker runs its own analyzer pool over the listed
+# devices ("cuda:1" indexes all visible GPUs), so workers are not pinned then
+pin_workers = bool(worker_gpus) and not os.environ.get("SFA_DEVICES")
+
+# Preloading loads the models once in the master and shares CPU weights with
+# the workers, but CUDA cannot be initialised before fork: on GPU hosts every
+# worker loads its own models after forking instead. MediaPipe graphs (and their
+# threads) are never preloaded; post_worker_init builds them in each worker
+gpu_host = (bool(worker_gpus) or "cuda" in os.environ.get("SFA_DEVICES", "")
+            or shutil.which("nvidia-smi") is not None)
+preload_app = os.environ.get("SFA_PRELOAD", "0" if gpu_host else "1") == "1"
+
+# One worker per core on CPU hosts. On GPU hosts each worker holds its own copy
+# of the models in GPU memory: one worker per pinned GPU, otherwise a single one
+if gpu_host:
+    default_workers = len(worker_gpus) if pin_workers else 1
+else:
+    default_workers = multiprocessing.cpu_count()
+workers = int(os.environ.get("WEB_CONCURRENCY", default_workers))
+
+# Workers read this to split the CPU cores between them (cpu_threads_per_worker)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+
+def post_fork(server, worker):
+    """Pin each worker to one GPU before it initialises CUDA"""
+    if pin_workers and not preload_app:
+        gpu = worker_gpus[(worker.age - 1) % len(worker_gpus)]
+        os.environ["CUDA_VISIBLE_DEVICES"] = gpu
+        server.log.info(f"Worker {worker.pid} using GPU {gpu}")
+
+
+def post_worker_init(worker):
+    """Build the MediaPipe graphs in the worker before it takes requests"""
+    import server
+    for analyzer in server.analyzers:
+        analyzer.mediapipe_graphs()
@@ -0,0 +1,168 @@
+"""
+Shared-backbone multi-head ViT for face analysis.
+
+Runs one ViT backbone per face and three small linear heads (age, race,
+emotion) on the CLS embedding instead of three full ViT forwards.
+
+The backbone and age head are copied from the age classifier; the race and
+emotion heads are distilled from the original classifiers:
+
+    python multihead_vit.py --faces ./face_crops --output ./model_cache/multihead.pt
+"""
+
+import argparse
+import copy
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import torch
+from torch import nn
+from transformers import ViTConfig
+
+logger = logging.getLogger(__name__)
+
+
+class MultiHeadFaceViT(nn.Module):
+    """One ViT backbone with age, race and emotion classification heads"""
+
+    def __init__(self, backbone: nn.Module, age_head: nn.Linear,
+                 num_race: int, num_emotion: int, labels: Dict[str, List[str]]):
+        super().__init__()
+        self.backbone = backbone
+        self.config = backbone.config
+        hidden = self.config.hidden_size
+
+        self.age_head = age_head
+        self.race_head = nn.Linear(hidden, num_race)
+        self.emotion_head = nn.Linear(hidden, num_emotion)
+
+        # Label names per head, e.g. {"emotion": ["angry", "disgust", ...]}
+        self.labels = labels
+
+    def forward(self, pixel_values: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Return (age_logits, race_logits, emotion_logits)"""
+        hidden_states = self.backbone(pixel_values=pixel_values).last_hidden_state
+        cls_embedding = hidden_states[:, 0]
+        return (self.age_head(cls_embedding),
+                self.race_head(cls_embedding),
+                self.emotion_head(cls_embedding))
+
+    @classmethod
+    def from_teachers(cls, age_model, race_model, emotion_model) -> "MultiHeadFaceViT":
+        """Initialise from the original classifiers (backbone + age head from the age model)"""
+        def labels_of(model):
+            id2label = model.config.id2label
+            return [id2label[i] for i in range(len(id2label))]
+
+        return cls(
+            backbone=copy.deepcopy(age_model.vit),
+            age_head=copy.deepcopy(age_model.classifier),
+            num_race=race_model.config.num_labels,
+            num_emotion=emotion_model.config.num_labels,
+            labels={
+                "age": labels_of(age_model),
+                "race": labels_of(race_model),
+                "emotion": labels_of(emotion_model),
+            },
+        )
+
+    def save(self, path: Path):
+        """Save weights, backbone config and head labels to a single file"""
+        torch.save({
+            "config": self.config.to_dict(),
+            "labels": self.labels,
+            "state_dict": self.state_dict(),
+        }, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "MultiHeadFaceViT":
+        """Load a checkpoint written by save()"""
+        from transformers import ViTModel
+
+        checkpoint = torch.load(path, map_location="cpu")
+        config = ViTConfig.from_dict(checkpoint["config"])
+        labels = checkpoint["labels"]
+
+        model = cls(
+            backbone=ViTModel(config, add_pooling_layer=False),
+            age_head=nn.Linear(config.hidden_size, len(labels["age"])),
+            num_race=len(labels["race"]),
+            num_emotion=len(labels["emotion"]),
+            labels=labels,
+        )
+        model.load_state_dict(checkpoint["state_dict"])
+        return model.eval()
+
+
+def distill_heads(student: MultiHeadFaceViT, race_model, emotion_model,
+                  face_batches: Iterable[torch.Tensor], epochs: int = 3,
+                  lr: float = 1e-3, temperature: float = 2.0) -> MultiHeadFaceViT:
+    """Train the race/emotion heads against the teachers' softmax outputs (backbone frozen)"""
+    student.backbone.requires_grad_(False)
+    student.age_head.requires_grad_(False)
+    params = list(student.race_head.parameters()) + list(student.emotion_head.parameters())
+    optimizer = torch.optim.AdamW(params, lr=lr)
+    kl_div = nn.KLDivLoss(reduction="batchmean")
+
+    race_model.eval()
+    emotion_model.eval()
+    student.train()
+
+    for epoch in range(epochs):
+        total_loss = 0.0
+        for pixel_values in face_batches:
+            with torch.no_grad():
+                race_targets = torch.softmax(race_model(pixel_values=pixel_values).logits / temperature, dim=-1)
+                emotion_targets = torch.softmax(emotion_model(pixel_values=pixel_values).logits / temperature, dim=-1)
+
+            _, race_logits, emotion_logits = student(pixel_values)
+            loss = (kl_div(torch.log_softmax(race_logits / temperature, dim=-1), race_targets)
+                    + kl_div(torch.log_softmax(emotion_logits / temperature, dim=-1), emotion_targets))
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+
+        logger.info(f"Distillation epoch {epoch + 1}/{epochs}: loss={total_loss:.4f}")
+
+    return student.eval()
+
+
+def main():
+    from PIL import Image
+    from transformers import AutoModelForImageClassification, AutoProcessor
+    from face_analyzer import AGE_MODEL_NAME, EMOTION_MODEL_NAME, RACE_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Distill a shared-backbone multi-head face ViT")
+    parser.add_argument("--faces", type=Path, required=True, help="Directory of cropped face images")
+    parser.add_argument("--output", type=Path, required=True, help="Checkpoint path to write")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    age_model = AutoModelForImageClassification.from_pretrained(AGE_MODEL_NAME)
+    race_model = AutoModelForImageClassification.from_pretrained(RACE_MODEL_NAME)
+    emotion_model = AutoModelForImageClassification.from_pretrained(EMOTION_MODEL_NAME)
+    processor = AutoProcessor.from_pretrained(AGE_MODEL_NAME)
+
+    face_paths = sorted(p for p in args.faces.iterdir() if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    face_batches = []
+    for start in range(0, len(face_paths), args.batch_size):
+        images = [Image.open(p).convert("RGB") for p in face_paths[start:start + args.batch_size]]
+        face_batches.append(processor(images, return_tensors="pt")["pixel_values"])
+    logger.info(f"Distilling on {len(face_paths)} faces")
+
+    student = MultiHeadFaceViT.from_teachers(age_model, race_model, emotion_model)
+    student = distill_heads(student, race_model, emotion_model, face_batches, epochs=args.epochs)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    student.save(args.output)
+    logger.info(f"Saved multi-head model to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
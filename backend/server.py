@@ -1,14 +1,24 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from anyio import to_thread
+from pymongo import InsertOne
+import asyncio
+import operator
 import os
+import time
+from time import perf_counter_ns
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 import uuid
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import base64
 import io
@@ -17,7 +27,8 @@ import cv2
 from PIL import Image
 
 # Import our face analyzer
-from face_analyzer import get_face_analyzer, FaceAnalysisResult
+from face_analyzer import (FaceAnalyzer, FaceAnalysisResult, FaceBatchResult,
+                           available_devices, configure_torch_precision)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -27,8 +38,43 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Analysis history is written in batches by history_flusher() so the
+# analyze endpoints don't wait on a MongoDB round-trip. Its writes are
+# acknowledged (they are off the request path anyway), so once flush_history()
+# returns, history reads and deletes see every entry queued before
+history_col = db.analysis_history
+HISTORY_MAX_BATCH = 100
+HISTORY_MAX_WAIT = 0.05  # seconds
+history_queue: asyncio.Queue = asyncio.Queue()
+history_pending = 0  # entries queued or being written
+history_flusher_task: Optional[asyncio.Task] = None
+
+# Images from concurrent requests are analyzed together by batch_worker()
+INFERENCE_MAX_BATCH = 8
+INFERENCE_MAX_WAIT = 0.05  # seconds
+inference_queue: asyncio.Queue = asyncio.Queue()
+batch_worker_task: Optional[asyncio.Task] = None
+
+# Uploads are read in chunks into one buffer; larger files are rejected
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Analytics summaries are cached briefly per session_id, least recently used first
+ANALYTICS_CACHE_TTL = 5.0  # seconds
+ANALYTICS_CACHE_MAX_ENTRIES = 1000
+analytics_cache: "OrderedDict[Optional[str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+analytics_locks: Dict[Optional[str], asyncio.Lock] = {}
+# Bumped on every invalidation; a summary computed across one is not cached
+analytics_generation = 0
+
+# Decoding runs in threads so it doesn't block the event loop (inference runs on
+# each analyzer's own thread): size of the loop's default executor
+# (asyncio.to_thread) and of anyio's threadpool
+THREADPOOL_SIZE = 32
+
 # Create the main app without a prefix
-app = FastAPI(title="Smart Face Analytics API", version="1.0.0")
+app = FastAPI(title="Smart Face Analytics API", version="1.0.0",
+              default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -40,9 +86,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class _UUIDPool:
+    """uuid4 strings carved from one os.urandom read per POOL_SIZE ids"""
+    POOL_SIZE = 1024
+    _ids: deque = deque()
+    _lock = threading.Lock()
+    
+    @classmethod
+    def next(cls) -> str:
+        while True:
+            try:
+                return cls._ids.popleft()
+            except IndexError:
+                cls._refill()
+    
+    @classmethod
+    def _refill(cls):
+        with cls._lock:
+            if cls._ids:
+                return
+            random = os.urandom(16 * cls.POOL_SIZE)
+            cls._ids.extend(str(uuid.UUID(bytes=random[i:i + 16], version=4))
+                            for i in range(0, len(random), 16))
+
 # Pydantic Models
 class FaceAnalysisResponse(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_UUIDPool.next)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     faces_detected: int
     total_confidence: float
@@ -51,7 +120,7 @@ class FaceAnalysisResponse(BaseModel):
     image_info: Dict[str, Any]
 
 class AnalysisHistory(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_UUIDPool.next)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     faces_count: int
     avg_age: float
@@ -61,7 +130,7 @@ class AnalysisHistory(BaseModel):
     session_id: Optional[str] = None
 
 class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_UUIDPool.next)
     client_name: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
@@ -69,13 +138,130 @@ class StatusCheckCreate(BaseModel):
     client_name: str
 
 class ImageAnalysisRequest(BaseModel):
+    """Deprecated JSON body for /analyze-image; send the raw image bytes instead"""
     image_data: str  # base64 encoded image
     session_id: Optional[str] = None
 
-# Initialize face analyzer
+# Initialize face analyzer at import time so a preloading server (gunicorn
+# --preload) loads the models once in the parent and workers share them
 logger.info("Initializing Face Analyzer...")
-analyzer = get_face_analyzer()
-logger.info("Face Analyzer initialized successfully!")
+configure_torch_precision()
+# One analyzer per SFA_DEVICES entry; batch_worker() hands each batch to an idle one
+analyzers = [FaceAnalyzer.preload_models(device) for device in available_devices()]
+analyzer = analyzers[0]  # used for decoding and model info
+idle_analyzers: asyncio.Queue = asyncio.Queue()
+for pooled_analyzer in analyzers:
+    idle_analyzers.put_nowait(pooled_analyzer)
+batch_tasks = set()
+logger.info(f"Face Analyzer initialized successfully on {', '.join(a.device for a in analyzers)}!")
+
+async def collect_batch(queue: asyncio.Queue, max_size: int, max_wait: float) -> List:
+    """Wait for one queue item, then gather more until max_size items or max_wait seconds"""
+    loop = asyncio.get_running_loop()
+    batch = [await queue.get()]
+    deadline = loop.time() + max_wait
+    while len(batch) < max_size:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+def invalidate_analytics(session_ids):
+    """Drop the cached summaries of these sessions and the summary over all sessions"""
+    global analytics_generation
+    analytics_generation += 1
+    for session_id in {None, *session_ids}:
+        analytics_cache.pop(session_id, None)
+
+async def write_history(entries: List[Dict[str, Any]]):
+    """Write a batch of analysis history entries"""
+    try:
+        await history_col.bulk_write([InsertOne(entry) for entry in entries], ordered=False)
+    except Exception as e:
+        logger.error(f"Error writing {len(entries)} history entries: {e}")
+    invalidate_analytics({entry["session_id"] for entry in entries})
+
+async def history_flusher():
+    """Drain history_queue, writing up to HISTORY_MAX_BATCH entries every HISTORY_MAX_WAIT"""
+    global history_pending
+    while True:
+        items = await collect_batch(history_queue, HISTORY_MAX_BATCH, HISTORY_MAX_WAIT)
+        stopping = None in items  # shutdown sentinel
+        # Futures are flush_history() waiters: everything queued before them is in this batch or written
+        waiters = [item for item in items if isinstance(item, asyncio.Future)]
+        entries = [item for item in items if isinstance(item, dict)]
+        if entries:
+            await write_history(entries)
+            history_pending -= len(entries)
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        if stopping:
+            return
+
+def queue_history(entry: Dict[str, Any]):
+    """Queue a history entry for history_flusher()"""
+    global history_pending
+    history_pending += 1
+    history_queue.put_nowait(entry)
+
+async def flush_history():
+    """Wait until every history entry queued so far has been written"""
+    if not history_pending or history_flusher_task is None or history_flusher_task.done():
+        return
+    waiter = asyncio.get_running_loop().create_future()
+    history_queue.put_nowait(waiter)
+    await waiter
+
+async def batch_worker():
+    """Hand batches of up to INFERENCE_MAX_BATCH queued images to idle analyzers"""
+    while True:
+        # Wait for a free analyzer first so the batch keeps filling meanwhile
+        batch_analyzer = await idle_analyzers.get()
+        batch = await collect_batch(inference_queue, INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT)
+        task = asyncio.create_task(run_batch(batch_analyzer, batch))
+        batch_tasks.add(task)
+        task.add_done_callback(batch_tasks.discard)
+
+async def run_batch(batch_analyzer: FaceAnalyzer, batch: List):
+    """Analyze one batch on the analyzer's inference thread and resolve its requests' futures"""
+    images, rgb_images, futures = zip(*batch)
+    try:
+        batch_results = await asyncio.get_running_loop().run_in_executor(
+            batch_analyzer.executor, batch_analyzer.analyze_batch, list(images), list(rgb_images))
+    except Exception as e:
+        batch_results = [e] * len(futures)
+    finally:
+        idle_analyzers.put_nowait(batch_analyzer)
+    
+    for future, results in zip(futures, batch_results):
+        if future.done():  # request was cancelled
+            continue
+        if isinstance(results, Exception):
+            future.set_exception(results)
+        else:
+            future.set_result(results)
+
+async def analyze_decoded(image: np.ndarray, rgb_image: Optional[np.ndarray]) -> FaceBatchResult:
+    """Queue a decoded image for batch_worker() and wait for its results"""
+    if image is None:
+        return FaceBatchResult.empty()
+    future = asyncio.get_running_loop().create_future()
+    await inference_queue.put((image, rgb_image, future))
+    return await future
+
+async def ensure_indexes():
+    """Create the indexes the history and status queries rely on (no-op if they exist)"""
+    try:
+        # Serves history queries by session (already sorted) and the analytics $match
+        await db.analysis_history.create_index([("session_id", 1), ("timestamp", -1)])
+        await db.status_checks.create_index([("timestamp", -1)])
+    except Exception as e:
+        logger.warning(f"Could not create MongoDB indexes: {e}")
 
 # Original routes
 @api_router.get("/")
@@ -91,174 +277,215 @@ async def create_status_check(input: StatusCheckCreate):
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    # Only the StatusCheck fields, newest first (timestamp index); the stored
+    # documents already match the model, so they are returned without re-validation
+    cursor = db.status_checks.find(
+        {}, {"id": 1, "client_name": 1, "timestamp": 1, "_id": 0}
+    ).sort("timestamp", -1).limit(1000)
+    return ORJSONResponse(content=await cursor.to_list(1000))
+
+def summarize_results(batch: FaceBatchResult) -> Tuple[float, float]:
+    """Total detection confidence and average age of the faces in a batch"""
+    if len(batch) == 0:
+        return 0.0, 0.0
+    return float(batch.confidences.sum()), float(batch.ages.mean())
+
+# FaceBatchResult columns, in the order results_data() unpacks them per face
+_batch_columns = operator.attrgetter(
+    'bboxes', 'confidences', 'ages', 'age_confidences', 'races',
+    'race_confidences', 'emotions', 'emotion_confidences', 'landmark_counts')
+
+def results_data(batch: FaceBatchResult) -> List[Dict[str, Any]]:
+    """Per-face response dicts, built from the batch columns in one comprehension"""
+    columns = [column.tolist() if isinstance(column, np.ndarray) else column
+               for column in _batch_columns(batch)]
+    return [
+        {
+            "face_id": i + 1,
+            "bbox": {"x": x, "y": y, "width": w, "height": h},
+            "confidence": confidence,
+            "age": {"value": age, "confidence": age_conf},
+            "race": {"value": race, "confidence": race_conf},
+            "emotion": {"value": emotion, "confidence": emotion_conf},
+            "landmarks_count": landmarks_count
+        }
+        for i, ((x, y, w, h), confidence, age, age_conf, race, race_conf,
+                emotion, emotion_conf, landmarks_count) in enumerate(zip(*columns))
+    ]
+
+async def read_bounded(chunks: AsyncIterator[bytes], size: Optional[int]) -> bytearray:
+    """Read chunks into a single preallocated buffer, rejecting more than MAX_UPLOAD_BYTES"""
+    too_large = HTTPException(status_code=413, detail=f"File exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise too_large
+    
+    # Preallocate when the size is known; grow the buffer only if it is not
+    buffer = bytearray(size or 0)
+    offset = 0
+    async for chunk in chunks:
+        if offset + len(chunk) > MAX_UPLOAD_BYTES:
+            raise too_large
+        buffer[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    
+    if offset < len(buffer):
+        del buffer[offset:]
+    return buffer
+
+async def read_upload(file: UploadFile) -> bytearray:
+    """Read a multipart upload, rejecting it past MAX_UPLOAD_BYTES"""
+    async def chunks():
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
+    
+    # Size is known for multipart uploads
+    return await read_bounded(chunks(), file.size)
+
+async def read_body(request: Request) -> bytearray:
+    """Read a raw request body as it streams in, rejecting it past MAX_UPLOAD_BYTES"""
+    content_length = request.headers.get("content-length", "")
+    size = int(content_length) if content_length.isdigit() else None
+    return await read_bounded(request.stream(), size)
 
 # Face Analysis Routes
-@api_router.post("/analyze-image", response_model=FaceAnalysisResponse)
-async def analyze_image_endpoint(request: ImageAnalysisRequest):
-    """Analyze faces in uploaded image"""
+# The analyze endpoints return plain dicts via ORJSONResponse; the model only documents them
+@api_router.post("/analyze-image", responses={200: {"model": FaceAnalysisResponse}})
+async def analyze_image_endpoint(request: Request, session_id: Optional[str] = None):
+    """Analyze faces in an image sent as the raw request body (or legacy base64 JSON)"""
+    body = await read_body(request)
+    
+    # Legacy clients post {"image_data": <base64>, "session_id": ...}
+    legacy_base64 = request.headers.get("content-type", "").startswith("application/json")
+    if legacy_base64:
+        logger.warning("Base64 JSON bodies for /analyze-image are deprecated; post the raw image bytes instead")
+        try:
+            legacy_request = ImageAnalysisRequest.model_validate_json(body)
+        except ValidationError as e:
+            # Reported like FastAPI's own body validation; the input (the raw body) is left out
+            raise RequestValidationError(e.errors(include_url=False, include_input=False))
+        session_id = legacy_request.session_id or session_id
+    
     try:
-        import time
-        start_time = time.time()
+        start_time = perf_counter_ns()
+        now = datetime.utcnow()  # shared by the response and its history entry
         
         logger.info("Starting image analysis...")
         
         # Analyze image using our face analyzer
-        analysis_results = analyzer.analyze_image_from_base64(request.image_data)
+        if legacy_base64:
+            image, rgb_image = await asyncio.to_thread(analyzer.decode_base64_image, legacy_request.image_data)
+        else:
+            image, rgb_image = await asyncio.to_thread(analyzer.decode_image, body)
+        batch = await analyze_decoded(image, rgb_image)
         
-        processing_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+        processing_time = (perf_counter_ns() - start_time) / 1e6  # Convert to milliseconds
         
         # Process results
-        faces_detected = len(analysis_results)
-        total_confidence = sum(result.confidence for result in analysis_results) if analysis_results else 0
+        faces_detected = len(batch)
+        total_confidence, avg_age = summarize_results(batch)
         
         # Convert results to dictionary format
-        results_data = []
-        for i, result in enumerate(analysis_results):
-            result_dict = {
-                "face_id": i + 1,
-                "bbox": {
-                    "x": result.bbox[0],
-                    "y": result.bbox[1], 
-                    "width": result.bbox[2],
-                    "height": result.bbox[3]
-                },
-                "confidence": result.confidence,
-                "age": {
-                    "value": result.age,
-                    "confidence": result.age_confidence
-                },
-                "race": {
-                    "value": result.race,
-                    "confidence": result.race_confidence
-                },
-                "emotion": {
-                    "value": result.emotion,
-                    "confidence": result.emotion_confidence
-                },
-                "landmarks_count": len(result.landmarks)
-            }
-            results_data.append(result_dict)
+        face_results = results_data(batch)
         
         # Create response
-        response = FaceAnalysisResponse(
-            faces_detected=faces_detected,
-            total_confidence=total_confidence,
-            results=results_data,
-            processing_time_ms=processing_time,
-            image_info={
-                "format": "base64",
+        response = {
+            "id": _UUIDPool.next(),
+            "timestamp": now,
+            "faces_detected": faces_detected,
+            "total_confidence": total_confidence,
+            "results": face_results,
+            "processing_time_ms": processing_time,
+            "image_info": {
+                "format": "base64" if legacy_base64 else "raw",
+                "size": len(body),
                 "faces_found": faces_detected
             }
-        )
+        }
         
         # Store analysis history
         if faces_detected > 0:
-            avg_age = sum(result.age for result in analysis_results) / faces_detected
-            emotions = [result.emotion for result in analysis_results]
-            races = [result.race for result in analysis_results]
-            
-            history_entry = AnalysisHistory(
-                faces_count=faces_detected,
-                avg_age=avg_age,
-                emotions=emotions,
-                races=races,
-                processing_time_ms=processing_time,
-                session_id=request.session_id
-            )
+            # Same fields as AnalysisHistory, built directly (internal, no validation needed)
+            history_entry = {
+                "id": _UUIDPool.next(),
+                "timestamp": now,
+                "faces_count": faces_detected,
+                "avg_age": avg_age,
+                "emotions": batch.emotions,
+                "races": batch.races,
+                "processing_time_ms": processing_time,
+                "session_id": session_id
+            }
             
-            await db.analysis_history.insert_one(history_entry.dict())
+            queue_history(history_entry)
         
         logger.info(f"Analysis completed: {faces_detected} faces detected in {processing_time:.2f}ms")
-        return response
+        return ORJSONResponse(content=response)
         
     except Exception as e:
         logger.error(f"Error in image analysis: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-@api_router.post("/analyze-upload")
+@api_router.post("/analyze-upload", responses={200: {"model": FaceAnalysisResponse}})
 async def analyze_uploaded_file(file: UploadFile = File(...), session_id: str = Form(None)):
     """Analyze faces in uploaded file"""
     try:
-        import time
-        start_time = time.time()
+        start_time = perf_counter_ns()
+        now = datetime.utcnow()  # shared by the response and its history entry
         
         # Validate file type
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
         # Read file contents
-        file_contents = await file.read()
+        file_contents = await read_upload(file)
         
         # Analyze image
-        analysis_results = analyzer.analyze_image_from_bytes(file_contents)
+        image, rgb_image = await asyncio.to_thread(analyzer.decode_image, file_contents)
+        batch = await analyze_decoded(image, rgb_image)
         
-        processing_time = (time.time() - start_time) * 1000
+        processing_time = (perf_counter_ns() - start_time) / 1e6
         
         # Process results (same as above)
-        faces_detected = len(analysis_results)
-        total_confidence = sum(result.confidence for result in analysis_results) if analysis_results else 0
-        
-        results_data = []
-        for i, result in enumerate(analysis_results):
-            result_dict = {
-                "face_id": i + 1,
-                "bbox": {
-                    "x": result.bbox[0],
-                    "y": result.bbox[1], 
-                    "width": result.bbox[2],
-                    "height": result.bbox[3]
-                },
-                "confidence": result.confidence,
-                "age": {
-                    "value": result.age,
-                    "confidence": result.age_confidence
-                },
-                "race": {
-                    "value": result.race,
-                    "confidence": result.race_confidence
-                },
-                "emotion": {
-                    "value": result.emotion,
-                    "confidence": result.emotion_confidence
-                },
-                "landmarks_count": len(result.landmarks)
-            }
-            results_data.append(result_dict)
-        
-        response = FaceAnalysisResponse(
-            faces_detected=faces_detected,
-            total_confidence=total_confidence,
-            results=results_data,
-            processing_time_ms=processing_time,
-            image_info={
+        faces_detected = len(batch)
+        total_confidence, avg_age = summarize_results(batch)
+        
+        face_results = results_data(batch)
+        
+        response = {
+            "id": _UUIDPool.next(),
+            "timestamp": now,
+            "faces_detected": faces_detected,
+            "total_confidence": total_confidence,
+            "results": face_results,
+            "processing_time_ms": processing_time,
+            "image_info": {
                 "filename": file.filename,
                 "size": len(file_contents),
                 "content_type": file.content_type,
                 "faces_found": faces_detected
             }
-        )
+        }
         
         # Store history
         if faces_detected > 0:
-            avg_age = sum(result.age for result in analysis_results) / faces_detected
-            emotions = [result.emotion for result in analysis_results]
-            races = [result.race for result in analysis_results]
-            
-            history_entry = AnalysisHistory(
-                faces_count=faces_detected,
-                avg_age=avg_age,
-                emotions=emotions,
-                races=races,
-                processing_time_ms=processing_time,
-                session_id=session_id
-            )
+            # Same fields as AnalysisHistory, built directly (internal, no validation needed)
+            history_entry = {
+                "id": _UUIDPool.next(),
+                "timestamp": now,
+                "faces_count": faces_detected,
+                "avg_age": avg_age,
+                "emotions": batch.emotions,
+                "races": batch.races,
+                "processing_time_ms": processing_time,
+                "session_id": session_id
+            }
             
-            await db.analysis_history.insert_one(history_entry.dict())
+            queue_history(history_entry)
         
-        return response
+        return ORJSONResponse(content=response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in file analysis: {e}")
         raise HTTPException(status_code=500, detail=f"File analysis failed: {str(e)}")
@@ -267,6 +494,7 @@ async def analyze_uploaded_file(file: UploadFile = File(...), session_id: str =
 async def get_analysis_history(session_id: Optional[str] = None, limit: int = 100):
     """Get analysis history"""
     try:
+        await flush_history()
         query = {}
         if session_id:
             query["session_id"] = session_id
@@ -278,69 +506,75 @@ async def get_analysis_history(session_id: Optional[str] = None, limit: int = 10
         logger.error(f"Error fetching history: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch history")
 
+async def compute_analytics_summary(session_id: Optional[str]) -> Dict[str, Any]:
+    """Aggregate the history in MongoDB; only the summary crosses the wire"""
+    query = {}
+    if session_id:
+        query["session_id"] = session_id
+    
+    # Zero averages are treated as missing, matching the history entries' defaults
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "total_analyses": {"$sum": 1},
+                "total_faces": {"$sum": "$faces_count"},
+                "avg_age": {"$avg": {"$cond": [{"$gt": ["$avg_age", 0]}, "$avg_age", None]}},
+                "avg_processing_time": {"$avg": {"$cond": [
+                    {"$gt": ["$processing_time_ms", 0]}, "$processing_time_ms", None]}},
+            }}],
+            "emotions": [{"$unwind": "$emotions"}, {"$sortByCount": "$emotions"}],
+            "races": [{"$unwind": "$races"}, {"$sortByCount": "$races"}],
+        }},
+    ]
+    facets = (await db.analysis_history.aggregate(pipeline).to_list(1))[0]
+    totals = facets["totals"][0] if facets["totals"] else {}
+    
+    return {
+        "total_analyses": totals.get("total_analyses", 0),
+        "total_faces": totals.get("total_faces", 0),
+        "avg_age": round(totals.get("avg_age") or 0, 1),
+        "emotion_distribution": {item["_id"]: item["count"] for item in facets["emotions"]},
+        "race_distribution": {item["_id"]: item["count"] for item in facets["races"]},
+        "avg_processing_time": round(totals.get("avg_processing_time") or 0, 2)
+    }
+
 @api_router.get("/analytics/summary")
 async def get_analytics_summary(session_id: Optional[str] = None):
     """Get analytics summary"""
+    session_id = session_id or None  # an empty session_id summarizes all sessions too
     try:
-        query = {}
-        if session_id:
-            query["session_id"] = session_id
-        
-        # Get all history records
-        history = await db.analysis_history.find(query).to_list(1000)
-        
-        if not history:
-            return {
-                "total_analyses": 0,
-                "total_faces": 0,
-                "avg_age": 0,
-                "emotion_distribution": {},
-                "race_distribution": {},
-                "avg_processing_time": 0
-            }
-        
-        # Calculate statistics
-        total_analyses = len(history)
-        total_faces = sum(item['faces_count'] for item in history)
-        
-        # Average age calculation
-        all_ages = []
-        all_emotions = []
-        all_races = []
-        processing_times = []
-        
-        for item in history:
-            if item.get('avg_age'):
-                all_ages.append(item['avg_age'])
-            if item.get('emotions'):
-                all_emotions.extend(item['emotions'])
-            if item.get('races'):
-                all_races.extend(item['races'])
-            if item.get('processing_time_ms'):
-                processing_times.append(item['processing_time_ms'])
-        
-        avg_age = sum(all_ages) / len(all_ages) if all_ages else 0
-        
-        # Emotion distribution
-        emotion_dist = {}
-        for emotion in all_emotions:
-            emotion_dist[emotion] = emotion_dist.get(emotion, 0) + 1
-        
-        # Race distribution
-        race_dist = {}
-        for race in all_races:
-            race_dist[race] = race_dist.get(race, 0) + 1
-        
-        avg_processing_time = sum(processing_times) / len(processing_times) if processing_times else 0
+        await flush_history()
+        cached = analytics_cache.get(session_id)
+        if cached and cached[0] > time.monotonic():
+            analytics_cache.move_to_end(session_id)
+            return cached[1]
+        
+        # Single flight: concurrent misses for a session wait for one aggregation
+        lock = analytics_locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            cached = analytics_cache.get(session_id)
+            if cached and cached[0] > now:
+                return cached[1]
+            
+            generation = analytics_generation
+            summary = await compute_analytics_summary(session_id)
+            if generation != analytics_generation:
+                # History changed meanwhile: serve it, but don't cache it
+                return summary
+            
+            analytics_cache[session_id] = (now + ANALYTICS_CACHE_TTL, summary)
+            analytics_cache.move_to_end(session_id)
+            
+            # Evict the least recently used sessions (and their idle locks) past the cap
+            while len(analytics_cache) > ANALYTICS_CACHE_MAX_ENTRIES:
+                key, _ = analytics_cache.popitem(last=False)
+                if key in analytics_locks and not analytics_locks[key].locked():
+                    del analytics_locks[key]
         
-        return {
-            "total_analyses": total_analyses,
-            "total_faces": total_faces,
-            "avg_age": round(avg_age, 1),
-            "emotion_distribution": emotion_dist,
-            "race_distribution": race_dist,
-            "avg_processing_time": round(avg_processing_time, 2)
-        }
+        return summary
         
     except Exception as e:
         logger.error(f"Error generating analytics: {e}")
@@ -350,11 +584,14 @@ async def get_analytics_summary(session_id: Optional[str] = None):
 async def clear_analysis_history(session_id: Optional[str] = None):
     """Clear analysis history"""
     try:
+        # Entries still queued would otherwise be written after the delete
+        await flush_history()
         query = {}
         if session_id:
             query["session_id"] = session_id
         
         result = await db.analysis_history.delete_many(query)
+        invalidate_analytics([session_id] if session_id else list(analytics_cache))
         
         return {
             "deleted_count": result.deleted_count,
@@ -376,6 +613,9 @@ async def get_model_info():
         "race_classification": "HuggingFace Gender/Demographics Classification",
         "landmarks": "MediaPipe Face Mesh",
         "device": analyzer.device,
+        "backend": analyzer.backend_name,
+        "model_backends": analyzer.model_backends,
+        "devices": [pooled_analyzer.device for pooled_analyzer in analyzers],
         "status": "loaded"
     }
 
@@ -411,10 +651,25 @@ app.add_middleware(
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if batch_worker_task is not None:
+        batch_worker_task.cancel()
+    # Let the flusher write everything queued before closing the connection
+    if history_flusher_task is not None:
+        history_queue.put_nowait(None)
+        await history_flusher_task
     client.close()
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
+    global history_flusher_task, batch_worker_task
     logger.info("Smart Face Analytics API starting up...")
+    # asyncio.to_thread (decoding) runs on the loop's default executor
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=THREADPOOL_SIZE, thread_name_prefix="sfa-worker"))
+    # Sync endpoints and UploadFile I/O use anyio's threadpool instead (defaults to 40)
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    history_flusher_task = asyncio.create_task(history_flusher())
+    await ensure_indexes()
+    batch_worker_task = asyncio.create_task(batch_worker())
     logger.info("Models loaded and ready for analysis!")
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+TensorRT runtime for the classifier engines built by build_engine.py.
+
+TRTClassifier is called like a HuggingFace image classifier
+(``model(pixel_values=...).logits``) so FaceAnalyzer can use it unchanged.
+"""
+
+import logging
+from pathlib import Path
+from types import SimpleNamespace
+
+import tensorrt as trt
+import torch
+
+logger = logging.getLogger(__name__)
+
+TRT_LOGGER = trt.Logger(trt.Logger.WARNING)
+
+INPUT_NAME = "pixel_values"
+OUTPUT_NAME = "logits"
+
+
+class TRTClassifier:
+    """Runs a serialized TensorRT classifier engine on one CUDA device"""
+
+    def __init__(self, engine_path: Path, config, device: str = "cuda"):
+        # Label names etc. are read from the HF config, as for PyTorch models
+        self.config = config
+        self.device = torch.device(device)
+
+        with torch.cuda.device(self.device):
+            runtime = trt.Runtime(TRT_LOGGER)
+            self.engine = runtime.deserialize_cuda_engine(Path(engine_path).read_bytes())
+            if self.engine is None:
+                raise RuntimeError(f"Failed to deserialize TensorRT engine {engine_path}")
+            # An execution context is not thread-safe; each analyzer runs one batch at a time
+            self.context = self.engine.create_execution_context()
+
+        # (min, opt, max) input shapes of the engine's optimization profile
+        self.max_batch = self.engine.get_tensor_profile_shape(INPUT_NAME, 0)[2][0]
+        logger.info(f"Loaded TensorRT engine {engine_path} (max batch {self.max_batch})")
+
+    def __call__(self, pixel_values: torch.Tensor) -> SimpleNamespace:
+        chunks = [self._infer(chunk) for chunk in pixel_values.split(self.max_batch)]
+        return SimpleNamespace(logits=chunks[0] if len(chunks) == 1 else torch.cat(chunks))
+
+    def _infer(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """Run one batch no larger than the engine's max batch"""
+        pixel_values = pixel_values.to(self.device, dtype=torch.float32).contiguous()
+        logits = torch.empty((pixel_values.shape[0], self.config.num_labels),
+                             dtype=torch.float32, device=self.device)
+
+        self.context.set_input_shape(INPUT_NAME, tuple(pixel_values.shape))
+        self.context.set_tensor_address(INPUT_NAME, pixel_values.data_ptr())
+        self.context.set_tensor_address(OUTPUT_NAME, logits.data_ptr())
+
+        # Enqueue on torch's current stream so later torch ops are ordered after it
+        stream = torch.cuda.current_stream(self.device)
+        if not self.context.execute_async_v3(stream.cuda_stream):
+            raise RuntimeError("TensorRT inference failed")
+        return logits
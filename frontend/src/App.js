@@ -91,11 +91,12 @@ function App() {
     setError('');
     
     try {
-      const base64Data = imageData.split(',')[1]; // Remove data:image/jpeg;base64, prefix
+      // Send raw image bytes instead of a base64 string
+      const imageBlob = await (await fetch(imageData)).blob();
       
-      const response = await axios.post(`${API}/analyze-image`, {
-        image_data: base64Data,
-        session_id: sessionId
+      const response = await axios.post(`${API}/analyze-image`, imageBlob, {
+        headers: { 'Content-Type': imageBlob.type },
+        params: { session_id: sessionId }
       });
       
       setResults(response.data);
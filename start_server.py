@@ -8,16 +8,44 @@ import os
 import sys
 import subprocess
 import time
+import shutil
 import signal
+import socket
 import threading
-import importlib.util
+import urllib.request
+import hashlib
+import http.client
+import importlib.metadata
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.utils import canonicalize_name
+except ImportError:
+    # packaging belum terinstall: pakai salinan yang dibundel dengan pip
+    from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+    from pip._vendor.packaging.utils import canonicalize_name
+
+# Cache hasil check_prerequisites antar run
+PREREQS_CACHE_FILE = (Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+                      / "smart-face-analytics" / "prereqs.json")
+PREREQS_CACHE_TTL = 24 * 60 * 60
+
 class ServerManager:
     def __init__(self):
         self.backend_process = None
         self.frontend_process = None
         self.base_dir = Path(__file__).parent.absolute()
+        self.backend_dir = self.base_dir / "backend"
+        self.frontend_dir = self.base_dir / "frontend"
+        # Hasil parse requirements.txt dan scan importlib.metadata, dihitung sekali per run
+        self._req_cache = None
+        self._installed_cache = None
+        self._log_buffer = threading.local()
+        self._print_lock = threading.Lock()
+        self._shutdown = threading.Event()
         
     def print_banner(self):
         """Print aplikasi banner"""
@@ -33,29 +61,27 @@ class ServerManager:
         """Check semua prerequisites terpenuhi"""
         print("🔍 Checking prerequisites...")
         
-        # Check Python version
-        try:
-            python_version = subprocess.check_output([sys.executable, '--version']).decode().strip()
-            print(f"✅ {python_version}")
-        except:
-            print("❌ Python tidak terinstall")
-            return False
+        # Probe semua tools sekaligus; hasil dicetak dengan urutan tetap
+        probes = [
+            ("Python", [sys.executable, '--version'], "{}"),
+            ("Node.js", ['node', '--version'], "{}"),
+            ("Yarn", ['yarn', '--version'], "Yarn {}"),
+        ]
+        # Versi dari run sebelumnya (PATH sama, < 24 jam) dipakai tanpa spawn process
+        versions = self.load_prerequisites_cache()
+        cached = versions is not None
+        if not cached:
+            with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+                versions = list(executor.map(self.probe_version, [argv for _, argv, _ in probes]))
             
-        # Check Node.js
-        try:
-            node_version = subprocess.check_output(['node', '--version']).decode().strip()
-            print(f"✅ {node_version}")
-        except:
-            print("❌ Node.js tidak terinstall")
-            return False
+        for (label, _, version_format), version in zip(probes, versions):
+            if version is None:
+                print(f"❌ {label} tidak terinstall")
+                return False
+            print(f"✅ {version_format.format(version)}" + (" (cached)" if cached else ""))
             
-        # Check Yarn
-        try:
-            yarn_version = subprocess.check_output(['yarn', '--version']).decode().strip()
-            print(f"✅ Yarn {yarn_version}")
-        except:
-            print("❌ Yarn tidak terinstall")
-            return False
+        if not cached:
+            self.save_prerequisites_cache(versions)
             
         # Check directory structure
         required_dirs = ['backend', 'frontend']
@@ -69,213 +95,409 @@ class ServerManager:
         print("✅ Semua prerequisites terpenuhi!")
         return True
 
-    def check_python_package_installed(self, package_name):
-        """Check jika Python package sudah terinstall"""
+    def prerequisites_cache_key(self):
+        """Key cache prerequisites: sha1 dari PATH dan interpreter Python yang dipakai"""
+        return hashlib.sha1(f"{os.environ.get('PATH', '')}\0{sys.executable}".encode()).hexdigest()
+
+    def load_prerequisites_cache(self):
+        """Versi tools dari cache, atau None jika tidak ada/kadaluarsa/PATH berubah"""
         try:
-            spec = importlib.util.find_spec(package_name)
-            return spec is not None
-        except ImportError:
-            return False
+            if time.time() - PREREQS_CACHE_FILE.stat().st_mtime > PREREQS_CACHE_TTL:
+                return None
+            with open(PREREQS_CACHE_FILE, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(cache, dict) or cache.get("key") != self.prerequisites_cache_key():
+            return None
+        return cache.get("versions")
+
+    def save_prerequisites_cache(self, versions):
+        """Simpan versi tools yang lolos check ke cache"""
+        try:
+            PREREQS_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(PREREQS_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({"key": self.prerequisites_cache_key(), "versions": versions}, f)
+        except OSError:
+            pass
+
+    def probe_version(self, argv):
+        """Jalankan `<tool> --version`, return output atau None jika gagal"""
+        try:
+            result = subprocess.run(argv, capture_output=True, text=True, timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip()
+
+    @staticmethod
+    def normalize_package_name(name):
+        """Normalisasi nama distribusi (PEP 503), mis. 'Scikit_Learn' -> 'scikit-learn'"""
+        return canonicalize_name(name)
+
+    def get_installed_packages(self):
+        """Set nama distribusi yang terinstall, dari satu scan importlib.metadata"""
+        if self._installed_cache is None:
+            self._installed_cache = {
+                self.normalize_package_name(dist.metadata['Name'])
+                for dist in importlib.metadata.distributions()
+                if dist.metadata['Name']
+            }
+        return self._installed_cache
 
     def get_required_packages(self):
-        """Dapatkan list package dari requirements.txt"""
-        backend_dir = self.base_dir / "backend"
-        requirements_file = backend_dir / "requirements.txt"
-        
+        """Dapatkan package dari requirements.txt: {nama: baris requirement asli}"""
+        if self._req_cache is None:
+            self._req_cache = self.parse_requirements(self.backend_dir / "requirements.txt")
+        return self._req_cache
+
+    def parse_requirements(self, requirements_file):
+        """Parse requirements.txt, skip baris yang bukan requirement"""
         if not requirements_file.exists():
-            return []
+            return {}
             
         with open(requirements_file, 'r', encoding='utf-8') as f:
-            packages = []
+            packages = {}
             for line in f:
-                line = line.strip()
-                # Skip empty lines dan comments
-                if not line or line.startswith('#') or line.startswith('--'):
+                line = line.split(' #')[0].strip()
+                # Skip empty lines, comments dan pip options (-r, -e, --index-url, ...)
+                if not line or line.startswith('#') or line.startswith('-'):
+                    continue
+                try:
+                    requirement = Requirement(line)
+                except InvalidRequirement:
                     continue
-                # Extract package name (remove version specifiers)
-                package_name = line.split('>=')[0].split('==')[0].split('[')[0].strip()
-                if package_name:
-                    packages.append(package_name)
+                # Skip requirement yang tidak berlaku di environment ini (env markers)
+                if requirement.marker and not requirement.marker.evaluate():
+                    continue
+                packages[canonicalize_name(requirement.name)] = line
             return packages
 
     def check_backend_dependencies(self):
-        """Check apakah semua backend dependencies sudah terinstall"""
-        print("🔍 Checking backend dependencies...")
+        """Check backend dependencies, return baris requirement yang belum terinstall
+        
+        Return None jika requirements.txt tidak ditemukan.
+        """
+        self.log("🔍 Checking backend dependencies...")
         
-        backend_dir = self.base_dir / "backend"
-        requirements_file = backend_dir / "requirements.txt"
+        requirements_file = self.backend_dir / "requirements.txt"
         
         if not requirements_file.exists():
-            print("❌ requirements.txt tidak ditemukan")
-            return False
+            self.log("❌ requirements.txt tidak ditemukan")
+            return None
             
         required_packages = self.get_required_packages()
+        installed_packages = self.get_installed_packages()
         missing_packages = []
         
-        for package in required_packages:
-            if self.check_python_package_installed(package):
-                print(f"  ✅ {package}")
+        for package, requirement in required_packages.items():
+            if self.normalize_package_name(package) in installed_packages:
+                self.log(f"  ✅ {package}")
             else:
-                print(f"  ❌ {package}")
-                missing_packages.append(package)
+                self.log(f"  ❌ {package}")
+                missing_packages.append(requirement)
                 
         if missing_packages:
-            print(f"📦 {len(missing_packages)} packages perlu diinstall")
-            return False
+            self.log(f"📦 {len(missing_packages)} packages perlu diinstall")
         else:
-            print("✅ Semua backend dependencies sudah terinstall")
-            return True
+            self.log("✅ Semua backend dependencies sudah terinstall")
+        return missing_packages
 
     def check_frontend_dependencies(self):
         """Check apakah frontend dependencies sudah terinstall"""
-        print("🔍 Checking frontend dependencies...")
+        self.log("🔍 Checking frontend dependencies...")
         
-        frontend_dir = self.base_dir / "frontend"
-        node_modules = frontend_dir / "node_modules"
-        package_json = frontend_dir / "package.json"
+        node_modules = self.frontend_dir / "node_modules"
+        package_json = self.frontend_dir / "package.json"
         
         if not package_json.exists():
-            print("❌ package.json tidak ditemukan")
+            self.log("❌ package.json tidak ditemukan")
             return False
             
-        if node_modules.exists():
-            # Check jika node_modules ada dan tidak kosong
-            try:
-                list_dir = list(node_modules.iterdir())
-                if len(list_dir) > 0:
-                    print("✅ Frontend dependencies sudah terinstall")
-                    return True
-                else:
-                    print("❌ node_modules kosong")
-                    return False
-            except OSError:
-                print("❌ Tidak bisa akses node_modules")
-                return False
-        else:
-            print("❌ node_modules tidak ditemukan")
+        # Check jika node_modules ada dan tidak kosong; cukup baca entry pertama
+        try:
+            with os.scandir(node_modules) as entries:
+                non_empty = next(entries, None) is not None
+        except FileNotFoundError:
+            self.log("❌ node_modules tidak ditemukan")
+            return False
+        except OSError:
+            self.log("❌ Tidak bisa akses node_modules")
             return False
+            
+        if non_empty:
+            self.log("✅ Frontend dependencies sudah terinstall")
+            return True
+        self.log("❌ node_modules kosong")
+        return False
 
-    def install_backend_dependencies(self):
-        """Install backend dependencies hanya jika diperlukan"""
-        print("🔧 Checking backend dependencies...")
+    def deps_stamp(self, project_dir, *inputs):
+        """Path stamp file .deps_cache/<sha256 dari inputs>.ok untuk project_dir"""
+        digest = hashlib.sha256()
+        for data in inputs:
+            digest.update(data)
+        return project_dir / ".deps_cache" / f"{digest.hexdigest()}.ok"
+
+    def write_deps_stamp(self, stamp):
+        """Tandai dependencies sudah terverifikasi (stamp lama dihapus)"""
+        try:
+            stamp.parent.mkdir(exist_ok=True)
+            for old_stamp in stamp.parent.glob("*.ok"):
+                old_stamp.unlink()
+            stamp.touch()
+        except OSError:
+            pass
+
+    def backend_deps_stamp(self):
+        """Stamp backend: requirements.txt + versi dan path Python"""
+        requirements_file = self.backend_dir / "requirements.txt"
+        if not requirements_file.exists():
+            return None
+        return self.deps_stamp(self.backend_dir, requirements_file.read_bytes(),
+                               sys.version.encode(), sys.executable.encode())
+
+    def frontend_deps_stamp(self):
+        """Stamp frontend: package.json + yarn.lock"""
+        inputs = [path.read_bytes() for path in (self.frontend_dir / "package.json",
+                                                 self.frontend_dir / "yarn.lock")
+                  if path.exists()]
+        return self.deps_stamp(self.frontend_dir, *inputs)
+
+    def probe_backend(self):
+        """Check backend tanpa install: return (ok, baris requirement yang belum terinstall)
         
-        if self.check_backend_dependencies():
-            print("✅ Backend dependencies sudah up-to-date")
-            return True
-            
-        print("📦 Installing missing backend dependencies...")
-        backend_dir = self.base_dir / "backend"
+        missing None jika requirements.txt tidak ditemukan.
+        """
+        self.log("🔧 Checking backend dependencies...")
+        
+        # Skip pengecekan jika requirements.txt tidak berubah sejak verifikasi terakhir
+        stamp = self.backend_deps_stamp()
+        if stamp and stamp.exists():
+            self.log("✅ Backend dependencies sudah up-to-date (cached)")
+            return True, []
+        
+        missing_packages = self.check_backend_dependencies()
+        if missing_packages is None:
+            return False, None
+        if not missing_packages:
+            self.log("✅ Backend dependencies sudah up-to-date")
+            if stamp:
+                self.write_deps_stamp(stamp)
+            return True, []
+        return False, missing_packages
+
+    def install_backend_dependencies(self, missing_packages):
+        """Install backend dependencies yang belum terinstall"""
+        stamp = self.backend_deps_stamp()
+        self.log("📦 Installing missing backend dependencies...")
         
         try:
-            # Gunakan pip install dengan upgrade strategy
-            result = subprocess.run([
-                sys.executable, "-m", "pip", "install", "-r", "requirements.txt",
-                "--upgrade", "--quiet"
-            ], cwd=backend_dir, capture_output=True, text=True)
+            # Install hanya yang belum ada, dengan version specifier dari requirements.txt
+            pip_command = [sys.executable, "-m", "pip", "install", *missing_packages, "--quiet"]
+            
+            # uv (installer Rust, download paralel) jauh lebih cepat; fallback ke pip jika gagal
+            uv = shutil.which("uv")
+            if uv:
+                self.log("⚡ Using uv installer")
+                returncode = self.run_streamed([
+                    uv, "pip", "install", "--python", sys.executable, *missing_packages, "--quiet"
+                ], self.backend_dir, "uv")
+                if returncode != 0:
+                    self.log("⚠️  uv gagal, mencoba dengan pip...")
+                    returncode = self.run_streamed(pip_command, self.backend_dir, "pip")
+            else:
+                returncode = self.run_streamed(pip_command, self.backend_dir, "pip")
             
-            if result.returncode == 0:
-                print("✅ Backend dependencies installed/updated")
+            if returncode == 0:
+                self.log("✅ Backend dependencies installed/updated")
+                self._installed_cache = None
+                if stamp:
+                    self.write_deps_stamp(stamp)
                 return True
             else:
-                print(f"❌ Gagal install backend dependencies: {result.stderr}")
+                # Output installer sudah di-stream di atas
+                self.log(f"❌ Gagal install backend dependencies (exit code {returncode})")
                 return False
                 
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Gagal install backend dependencies: {e}")
+        except OSError as e:
+            self.log(f"❌ Gagal install backend dependencies: {e}")
             return False
 
-    def install_frontend_dependencies(self):
-        """Install frontend dependencies hanya jika diperlukan"""
-        print("🔧 Checking frontend dependencies...")
+    def probe_frontend(self):
+        """Check frontend tanpa install: return (ok, yang perlu diinstall)
+        
+        missing None jika package.json tidak ditemukan.
+        """
+        self.log("🔧 Checking frontend dependencies...")
         
+        # Skip jika package.json/yarn.lock tidak berubah dan node_modules masih ada
+        stamp = self.frontend_deps_stamp()
+        node_modules_exists = (self.frontend_dir / "node_modules").exists()
+        if node_modules_exists and stamp.exists():
+            self.log("✅ Frontend dependencies sudah up-to-date (cached)")
+            return True, []
+        
+        # node_modules ada tapi stamp lama punya hash berbeda: package.json/yarn.lock
+        # berubah, install ulang. node_modules yang hilang dilaporkan check_frontend_dependencies
+        lockfile_changed = node_modules_exists and stamp.parent.exists() and any(stamp.parent.glob("*.ok"))
+        if lockfile_changed:
+            self.log("📝 package.json/yarn.lock berubah sejak install terakhir")
+            return False, ["node_modules"]
         if self.check_frontend_dependencies():
-            print("✅ Frontend dependencies sudah up-to-date")
-            return True
-            
-        print("📦 Installing frontend dependencies...")
-        frontend_dir = self.base_dir / "frontend"
+            self.log("✅ Frontend dependencies sudah up-to-date")
+            self.write_deps_stamp(stamp)
+            return True, []
+        if not (self.frontend_dir / "package.json").exists():
+            return False, None
+        return False, ["node_modules"]
+
+    def install_frontend_dependencies(self):
+        """Install frontend dependencies dengan yarn"""
+        stamp = self.frontend_deps_stamp()
+        self.log("📦 Installing frontend dependencies...")
         
         try:
-            # Check jika yarn.lock ada untuk menentukan install strategy
-            yarn_lock = frontend_dir / "yarn.lock"
-            if yarn_lock.exists():
-                # Jika yarn.lock ada, gunakan yarn install (deterministic)
-                result = subprocess.run(["yarn", "install", "--silent"], 
-                                      cwd=frontend_dir, capture_output=True, text=True)
-            else:
-                # Jika tidak, gunakan yarn untuk install biasa
-                result = subprocess.run(["yarn", "install", "--silent"], 
-                                      cwd=frontend_dir, capture_output=True, text=True)
+            # Ambil dari offline mirror/cache yarn dulu, registry hanya untuk yang belum ada
+            yarn_command = ["yarn", "install", "--silent", "--prefer-offline"]
+            if (self.frontend_dir / "yarn.lock").exists():
+                # Jika yarn.lock ada, install persis sesuai lockfile (gagal jika tidak sinkron)
+                yarn_command.append("--frozen-lockfile")
+            returncode = self.run_streamed(yarn_command, self.frontend_dir, "yarn")
             
-            if result.returncode == 0:
-                print("✅ Frontend dependencies installed")
+            if returncode == 0:
+                self.log("✅ Frontend dependencies installed")
+                self.write_deps_stamp(stamp)
                 return True
             else:
-                print(f"❌ Gagal install frontend dependencies: {result.stderr}")
+                # Output yarn sudah di-stream di atas
+                self.log(f"❌ Gagal install frontend dependencies (exit code {returncode})")
                 return False
                 
         except Exception as e:
-            print(f"❌ Gagal install frontend dependencies: {e}")
+            self.log(f"❌ Gagal install frontend dependencies: {e}")
             return False
 
+    def log(self, message):
+        """Print, atau tampung ke buffer thread ini saat job berjalan paralel"""
+        buffer = getattr(self._log_buffer, 'lines', None)
+        if buffer is None:
+            print(message)
+        else:
+            buffer.append(message)
+
+    def run_buffered(self, job):
+        """Jalankan job dengan output ditampung, lalu cetak sekaligus (tidak bercampur)"""
+        self._log_buffer.lines = []
+        try:
+            return job()
+        finally:
+            self.flush_log()
+            self._log_buffer.lines = None
+
+    def flush_log(self):
+        """Cetak log yang sudah ditampung thread ini sekarang juga"""
+        lines = getattr(self._log_buffer, 'lines', None)
+        if lines:
+            with self._print_lock:
+                print("\n".join(lines), flush=True)
+            lines.clear()
+
+    def run_streamed(self, command, cwd, label):
+        """Jalankan installer, stream output per baris; return returncode"""
+        # Header job (mis. "Installing ...") tampil sebelum output installer
+        self.flush_log()
+        with subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, bufsize=1) as process:
+            for line in process.stdout:
+                # Tampil langsung (tidak ditampung run_buffered), diberi label karena bisa paralel
+                with self._print_lock:
+                    print(f"  [{label}] {line.rstrip()}", flush=True)
+        return process.returncode
+
     def install_dependencies(self):
         """Install dependencies hanya jika diperlukan"""
         print("\n📦 Checking dependencies...")
         
-        backend_success = self.install_backend_dependencies()
-        frontend_success = self.install_frontend_dependencies()
+        # Backend (pip) dan frontend (yarn) tidak saling bergantung: check dan install paralel
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            backend_probe = executor.submit(self.run_buffered, self.probe_backend)
+            frontend_probe = executor.submit(self.run_buffered, self.probe_frontend)
+            backend_ok, backend_missing = backend_probe.result()
+            frontend_ok, frontend_missing = frontend_probe.result()
+            
+            # Install hanya bagian yang belum lengkap; manifest yang tidak ditemukan
+            # hanya menggagalkan bagiannya sendiri, bagian lain tetap diinstall
+            results = []
+            installs = []
+            if backend_missing is None:
+                results.append(False)
+            elif not backend_ok:
+                installs.append(executor.submit(self.run_buffered,
+                                                lambda: self.install_backend_dependencies(backend_missing)))
+            if frontend_missing is None:
+                results.append(False)
+            elif not frontend_ok:
+                installs.append(executor.submit(self.run_buffered, self.install_frontend_dependencies))
+            results += [future.result() for future in installs]
         
-        return backend_success and frontend_success
+        return all(results)
 
     def check_environment_files(self):
         """Check dan setup environment files"""
         print("\n🔧 Checking environment files...")
         
-        # Backend environment
-        backend_dir = self.base_dir / "backend"
-        backend_env = backend_dir / ".env"
-        backend_env_example = backend_dir / ".env.example"
-        
-        if not backend_env.exists() and backend_env_example.exists():
-            print("📝 Creating backend .env file from .env.example")
-            backend_env.write_text(backend_env_example.read_text())
-            print("✅ Backend .env file created")
-        elif backend_env.exists():
-            print("✅ Backend .env file already exists")
-        else:
-            print("⚠️  Backend .env.example not found")
+        # (label, directory, baris wajib yang ditambahkan jika belum ada)
+        env_files = [
+            ("Backend", self.backend_dir, None),
+            ("Frontend", self.frontend_dir, "REACT_APP_BACKEND_URL=http://localhost:8001"),
+        ]
+        for label, project_dir, required_line in env_files:
+            env_file = project_dir / ".env"
+            env_example = project_dir / ".env.example"
             
-        # Frontend environment
-        frontend_dir = self.base_dir / "frontend"
-        frontend_env = frontend_dir / ".env"
-        frontend_env_example = frontend_dir / ".env.example"
-        
-        if not frontend_env.exists() and frontend_env_example.exists():
-            print("📝 Creating frontend .env file from .env.example")
-            env_content = frontend_env_example.read_text()
-            # Ensure backend URL is correct
-            if "REACT_APP_BACKEND_URL" not in env_content:
-                env_content += "\nREACT_APP_BACKEND_URL=http://localhost:8001"
-            frontend_env.write_text(env_content)
-            print("✅ Frontend .env file created")
-        elif frontend_env.exists():
-            print("✅ Frontend .env file already exists")
-        else:
-            print("⚠️  Frontend .env.example not found")
+            if not env_file.exists() and env_example.exists():
+                print(f"📝 Creating {label.lower()} .env file from .env.example")
+                shutil.copyfile(env_example, env_file)
+                # Ensure backend URL is correct
+                if required_line:
+                    key = required_line.split("=")[0].encode()
+                    if key not in env_file.read_bytes():
+                        with open(env_file, "ab") as f:
+                            f.write(b"\n" + required_line.encode())
+                print(f"✅ {label} .env file created")
+            elif env_file.exists():
+                print(f"✅ {label} .env file already exists")
+            else:
+                print(f"⚠️  {label} .env.example not found")
 
     def start_backend(self):
         """Start backend server"""
         print("\n🔧 Starting backend server...")
-        backend_dir = self.base_dir / "backend"
+            
+        command = [
+            sys.executable, "-m", "uvicorn", "server:app",
+            "--host", "0.0.0.0", "--port", "8001"
+        ]
+        if os.environ.get("SFA_DEV"):
+            # Mode development: auto-reload, watcher tanpa folder model_cache yang besar
+            command += ["--reload", "--reload-dir", str(self.backend_dir), "--reload-exclude", "model_cache"]
+            mode = "dev, auto-reload"
+        else:
+            # Uvicorn tidak punya preload: setiap worker memuat model sendiri (N worker = N salinan
+            # model), jadi multi-worker hanya jika WEB_CONCURRENCY diset secara eksplisit
+            workers = os.environ.get("WEB_CONCURRENCY")
+            if workers:
+                command += ["--workers", workers]
+                mode = f"{workers} workers"
+            else:
+                mode = "single process"
             
         try:
             # Start backend server
-            self.backend_process = subprocess.Popen([
-                sys.executable, "-m", "uvicorn", "server:app", 
-                "--host", "0.0.0.0", "--port", "8001", "--reload"
-            ], cwd=backend_dir)
+            self.backend_process = subprocess.Popen(command, cwd=self.backend_dir, start_new_session=True)
             
-            print("✅ Backend server started on http://localhost:8001")
+            print(f"✅ Backend server started on http://localhost:8001 ({mode})")
             return True
             
         except Exception as e:
@@ -285,13 +507,12 @@ class ServerManager:
     def start_frontend(self):
         """Start frontend development server"""
         print("\n🎨 Starting frontend server...")
-        frontend_dir = self.base_dir / "frontend"
             
         try:
             # Start frontend server
             self.frontend_process = subprocess.Popen([
                 "yarn", "start"
-            ], cwd=frontend_dir)
+            ], cwd=self.frontend_dir, start_new_session=True)
             
             print("✅ Frontend server started on http://localhost:3000")
             return True
@@ -303,59 +524,83 @@ class ServerManager:
     def wait_for_backend(self, timeout=30):
         """Wait for backend to be ready"""
         print("⏳ Waiting for backend to be ready...")
-        import requests
         
-        start_time = time.time()
-        while time.time() - start_time < timeout:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            # Probe port dulu (murah), health check HTTP hanya setelah port menerima koneksi
             try:
-                response = requests.get("http://localhost:8001/api/health", timeout=5)
-                if response.status_code == 200:
-                    print("✅ Backend is ready!")
-                    return True
-            except:
+                socket.create_connection(("127.0.0.1", 8001), timeout=0.2).close()
+                with urllib.request.urlopen("http://127.0.0.1:8001/api/health", timeout=2) as response:
+                    if response.status == 200:
+                        print("✅ Backend is ready!")
+                        return True
+            except (OSError, http.client.HTTPException):
                 pass
-            time.sleep(2)
+            time.sleep(0.05)
             
         print("⚠️  Backend lambat loading, melanjutkan...")
         return True  # Return True untuk melanjutkan meskipun timeout
         
     def monitor_processes(self):
         """Monitor processes and restart if needed"""
-        def monitor():
-            while True:
-                if self.backend_process and self.backend_process.poll() is not None:
-                    print("❌ Backend process stopped, restarting...")
-                    self.start_backend()
-                    
-                if self.frontend_process and self.frontend_process.poll() is not None:
-                    print("❌ Frontend process stopped, restarting...")
-                    self.start_frontend()
+        def watch(name, get_process, restart):
+            # Block di wait() sampai process exit, lalu restart langsung (tanpa polling)
+            while not self._shutdown.is_set():
+                process = get_process()
+                if process is None:
+                    return
+                started = time.monotonic()
+                process.wait()
+                if self._shutdown.is_set():
+                    return
                     
-                time.sleep(5)
+                print(f"❌ {name} process stopped, restarting...")
+                # Hindari restart loop yang cepat jika process langsung crash
+                if time.monotonic() - started < 5 and self._shutdown.wait(5):
+                    return
+                if not restart():
+                    return
                 
-        monitor_thread = threading.Thread(target=monitor, daemon=True)
-        monitor_thread.start()
+        for name, get_process, restart in (
+            ("Backend", lambda: self.backend_process, self.start_backend),
+            ("Frontend", lambda: self.frontend_process, self.start_frontend),
+        ):
+            threading.Thread(target=watch, args=(name, get_process, restart), daemon=True).start()
         
+    def signal_process_group(self, process, force=False):
+        """Terminate (atau kill) process beserta child-nya, mis. webpack dari `yarn start`"""
+        try:
+            if hasattr(os, "killpg"):
+                # Child dijalankan dengan start_new_session: PGID == PID
+                os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+            elif force:
+                process.kill()
+            else:
+                process.terminate()
+        except ProcessLookupError:
+            pass
+            
     def signal_handler(self, sig, frame):
         """Handle shutdown signals"""
         print("\n\n🛑 Shutting down servers...")
+        self._shutdown.set()
         
-        if self.frontend_process:
-            print("Stopping frontend server...")
-            self.frontend_process.terminate()
-            
-        if self.backend_process:
-            print("Stopping backend server...")
-            self.backend_process.terminate()
-            
-        # Wait for processes to terminate
-        time.sleep(2)
+        running = [(name, process) for name, process in
+                   (("frontend", self.frontend_process), ("backend", self.backend_process))
+                   if process and process.poll() is None]
         
-        # Force kill if still running
-        if self.frontend_process and self.frontend_process.poll() is None:
-            self.frontend_process.kill()
-        if self.backend_process and self.backend_process.poll() is None:
-            self.backend_process.kill()
+        for name, process in running:
+            print(f"Stopping {name} server...")
+            self.signal_process_group(process)
+            
+        # Wait for processes to terminate, force kill if still running
+        deadline = time.monotonic() + 3
+        for name, process in running:
+            try:
+                process.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self.signal_process_group(process, force=True)
+                process.wait()
             
         print("✅ All servers stopped. Goodbye! 👋")
         sys.exit(0)
@@ -380,20 +625,21 @@ class ServerManager:
         if not self.install_dependencies():
             print("\n⚠️  Ada masalah dengan dependencies, melanjutkan...")
             
-        # Start servers
+        # Start servers; frontend (webpack compile) start bersamaan dengan
+        # backend (model loading) supaya waktu tunggunya overlap
         if not self.start_backend():
             print("\n❌ Gagal start backend server.")
             sys.exit(1)
             
-        # Wait for backend to be ready
-        if not self.wait_for_backend():
-            print("\n⚠️  Backend lambat loading, melanjutkan...")
-            
         if not self.start_frontend():
             print("\n❌ Gagal start frontend server.")
             self.signal_handler(None, None)
             sys.exit(1)
             
+        # Wait for backend to be ready
+        if not self.wait_for_backend():
+            print("\n⚠️  Backend lambat loading, melanjutkan...")
+            
         # Start process monitoring
         self.monitor_processes()
         
@@ -406,10 +652,9 @@ class ServerManager:
         print("⏹️  Press Ctrl+C to stop all servers")
         print("="*60)
         
-        # Keep main thread alive
+        # Keep main thread alive: tidur sampai signal_handler set _shutdown (tanpa polling)
         try:
-            while True:
-                time.sleep(1)
+            self._shutdown.wait()
         except KeyboardInterrupt:
             self.signal_handler(None, None)
 
@@ -0,0 +1,216 @@
+import io
+import os
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import face_analyzer
+from face_analyzer import (FaceAnalyzer, FaceAnalysisResult, FaceBatchResult, ModelUnavailableError,
+                           RESULT_LANDMARKS, UNKNOWN_AGE, UNKNOWN_LABEL, available_devices,
+                           jpeg_exif_orientation, label_width)
+
+
+class FakeFaceMesh:
+    """Face Mesh stand-in returning no faces"""
+    multi_face_landmarks = None
+
+    def process(self, rgb_image):
+        return self
+
+
+def bare_analyzer() -> FaceAnalyzer:
+    """FaceAnalyzer without models, for the methods that don't run them"""
+    analyzer = FaceAnalyzer.__new__(FaceAnalyzer)
+    analyzer.video_mode = False
+    analyzer._pid = os.getpid()
+    analyzer._graphs = (None, FakeFaceMesh())
+    analyzer._video_graphs = None
+    analyzer._executor = None
+    analyzer.device = "cpu"
+    return analyzer
+
+
+def make_result(landmarks: np.ndarray) -> FaceAnalysisResult:
+    return FaceAnalysisResult(
+        face_detected=True, confidence=0.9, bbox=(100, 100, 50, 50),
+        age=30, age_confidence=0.8, race="Asian", race_confidence=0.7,
+        emotion="Happy", emotion_confidence=0.6, landmarks=landmarks)
+
+
+def jpeg_bytes(orientation=None) -> bytes:
+    image = Image.new("RGB", (8, 4), (255, 0, 0))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def test_get_face_landmarks_without_faces_is_empty_int32_array():
+    landmarks = bare_analyzer().get_face_landmarks(np.zeros((20, 20, 3), dtype=np.uint8))
+
+    assert landmarks.shape == (0, 2)
+    assert landmarks.dtype == np.int32
+
+
+def test_mediapipe_graphs_rebuilt_after_fork():
+    analyzer = bare_analyzer()
+    built = []
+    analyzer._create_image_graphs = lambda: built.append(os.getpid()) or ("detection", "mesh")
+    # As if the analyzer had been preloaded in a parent process
+    analyzer._pid = -1
+
+    assert analyzer.face_detection == "detection"
+    assert analyzer.face_mesh == "mesh"
+    assert built == [os.getpid()]
+
+
+def test_executor_is_one_thread_rebuilt_after_fork():
+    analyzer = bare_analyzer()
+    executor = analyzer.executor
+
+    threads = {analyzer.executor.submit(threading.get_ident).result() for _ in range(4)}
+    assert len(threads) == 1 and analyzer.executor is executor
+
+    analyzer._pid = -1
+    assert analyzer.executor is not executor
+    executor.shutdown()
+    analyzer.executor.shutdown()
+
+
+def test_match_landmarks_assigns_nearest_mesh():
+    faces = [{"bbox": (0, 0, 10, 10)}, {"bbox": (100, 100, 10, 10)}, {"bbox": (50, 50, 2, 2)}]
+    far_mesh = np.array([[104, 104], [106, 106]], dtype=np.int32)
+    near_mesh = np.array([[4, 4], [6, 6]], dtype=np.int32)
+
+    matched = bare_analyzer()._match_landmarks(faces, [far_mesh, near_mesh])
+
+    assert matched[0] is near_mesh
+    assert matched[1] is far_mesh
+    assert matched[2].shape == (0, 2)
+
+
+def test_build_results_keeps_landmarks_as_array():
+    mesh = np.arange(40, dtype=np.int32).reshape(20, 2)
+    faces = [{"confidence": 0.9, "bbox": (1, 2, 3, 4)}]
+
+    [result] = bare_analyzer()._build_results(faces, [mesh], [(30, 0.8)], [("Asian", 0.7)], [("Happy", 0.6)])
+
+    assert isinstance(result.landmarks, np.ndarray)
+    np.testing.assert_array_equal(result.landmarks, mesh[:RESULT_LANDMARKS])
+
+
+def test_draw_analysis_results_draws_landmark_dots():
+    image = np.zeros((300, 300, 3), dtype=np.uint8)
+    landmarks = np.array([[120, 130], [140, 130]], dtype=np.int32)
+
+    annotated = bare_analyzer().draw_analysis_results(image, [make_result(landmarks)])
+
+    for x, y in landmarks:
+        assert tuple(annotated[y, x]) == (255, 0, 0)
+    # Same pixels as the radius-2 filled circles drawn before
+    expected = image.copy()
+    for x, y in landmarks:
+        cv2.circle(expected, (int(x), int(y)), 2, (255, 0, 0), -1)
+    np.testing.assert_array_equal(annotated[125:136, 115:146], expected[125:136, 115:146])
+    assert not image.any()
+
+
+def test_label_width_measures_the_whole_label():
+    for text in ("Age: 25", "Race: Middle Eastern", "Emotion: Unknown"):
+        expected = cv2.getTextSize(text, face_analyzer.LABEL_FONT, face_analyzer.LABEL_FONT_SCALE,
+                                   face_analyzer.LABEL_THICKNESS)[0][0]
+        assert label_width(text) == expected
+
+
+def test_draw_analysis_results_without_landmarks():
+    image = np.zeros((300, 300, 3), dtype=np.uint8)
+
+    annotated = bare_analyzer().draw_analysis_results(image, [make_result(np.empty((0, 2), dtype=np.int32))])
+
+    assert not (annotated == (255, 0, 0)).all(axis=-1).any()
+
+
+def test_predict_or_unknown_marks_every_face_unknown_when_model_unavailable():
+    def _batch_estimate_age(face_images, pixel_values):
+        raise ModelUnavailableError("Age model is not loaded")
+
+    faces = [np.zeros((4, 4, 3), dtype=np.uint8)] * 3
+
+    ages = bare_analyzer()._predict_or_unknown(_batch_estimate_age, faces, None, UNKNOWN_AGE)
+
+    assert ages == [UNKNOWN_AGE] * 3
+
+
+def test_predict_or_unknown_marks_every_face_unknown_on_failure():
+    def _batch_classify_race(face_images, pixel_values):
+        raise ValueError("bad input")
+
+    races = bare_analyzer()._predict_or_unknown(_batch_classify_race, [None, None], None, UNKNOWN_LABEL)
+
+    assert races == [("Unknown", 0.0), ("Unknown", 0.0)]
+
+
+def test_predict_or_unknown_returns_predictions():
+    def _batch_detect_emotion(face_images, pixel_values):
+        return [("Happy", 0.9)] * len(face_images)
+
+    emotions = bare_analyzer()._predict_or_unknown(_batch_detect_emotion, [None], None, UNKNOWN_LABEL)
+
+    assert emotions == [("Happy", 0.9)]
+
+
+def test_face_batch_result_empty():
+    batch = FaceBatchResult.empty()
+
+    assert len(batch) == 0
+    assert batch.bboxes.shape == (0, 4)
+    assert batch.races == [] and batch.emotions == []
+
+
+def test_build_batch_result_packs_columns():
+    faces = [{"confidence": 0.9, "bbox": (1, 2, 3, 4)}, {"confidence": 0.5, "bbox": (5, 6, 7, 8)}]
+    landmarks = [np.zeros((468, 2), dtype=np.int32), np.empty((0, 2), dtype=np.int32)]
+
+    batch = bare_analyzer()._build_batch_result(
+        faces, landmarks, [(30, 0.8), UNKNOWN_AGE], [("Asian", 0.7), UNKNOWN_LABEL], [("Happy", 0.6), ("Sad", 0.4)])
+
+    assert len(batch) == 2
+    np.testing.assert_array_equal(batch.bboxes, [[1, 2, 3, 4], [5, 6, 7, 8]])
+    np.testing.assert_array_equal(batch.ages, [30, 0])
+    assert batch.races == ["Asian", "Unknown"]
+    assert batch.emotions == ["Happy", "Sad"]
+    np.testing.assert_array_equal(batch.landmark_counts, [RESULT_LANDMARKS, 0])
+
+
+def test_backend_name_reports_the_backends_models_loaded_with():
+    analyzer = bare_analyzer()
+    analyzer.dtype = "torch.float32"
+    analyzer.model_backends = {}
+    assert analyzer.backend_name == "pytorch-float32"
+
+    # TensorRT requested, but one engine was missing and fell back to PyTorch
+    analyzer.model_backends = {"age": "tensorrt-fp16", "emotion": "pytorch-float32", "race": "tensorrt-fp16"}
+    assert analyzer.backend_name == "tensorrt-fp16, pytorch-float32"
+
+
+def test_jpeg_exif_orientation():
+    assert jpeg_exif_orientation(jpeg_bytes()) == 1
+    assert jpeg_exif_orientation(jpeg_bytes(orientation=6)) == 6
+    assert jpeg_exif_orientation(jpeg_bytes(orientation=3)) == 3
+    assert jpeg_exif_orientation(b"\xff\xd8") == 1
+
+
+def test_available_devices_defaults_to_auto(monkeypatch):
+    monkeypatch.delenv("SFA_DEVICES", raising=False)
+
+    assert available_devices() == [None]
+
+
+def test_available_devices_skips_repeated_and_unsupported(monkeypatch):
+    monkeypatch.setenv("SFA_DEVICES", "cuda:1, CUDA:0,cpu,cuda:1,tpu,cpu")
+
+    assert available_devices() == ["cuda:1", "cuda:0", "cpu"]
@@ -0,0 +1,294 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+import face_analyzer
+from face_analyzer import FaceBatchResult
+
+
+class FakeAnalyzer:
+    """Analyzer stand-in that decodes nothing, so requests never reach the models"""
+    device = "cpu"
+    backend_name = "pytorch"
+
+    def __init__(self):
+        self.decoded = []
+
+    def decode_image(self, image_bytes):
+        self.decoded.append(bytes(image_bytes))
+        return None, None
+
+    def decode_base64_image(self, base64_string):
+        self.decoded.append(base64_string)
+        return None, None
+
+
+@pytest.fixture(scope="module")
+def server():
+    """The server module, imported without loading models or touching MongoDB"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("MONGO_URL", os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        mp.setenv("DB_NAME", os.environ.get("DB_NAME", "test_database"))
+        mp.setattr(face_analyzer, "configure_torch_precision", lambda: None)
+        mp.setattr(face_analyzer.FaceAnalyzer, "preload_models", staticmethod(lambda device=None: FakeAnalyzer()))
+        import server
+        yield server
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    # Startup (models, indexes, background tasks) is not run: no `with TestClient(...)`
+    monkeypatch.setattr(server, "analyzer", FakeAnalyzer())
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def analytics(server, monkeypatch):
+    """Clean analytics cache, with MongoDB aggregation replaced by a counting fake"""
+    calls = []
+
+    async def compute_analytics_summary(session_id):
+        calls.append(session_id)
+        await asyncio.sleep(0.01)
+        return {"session": session_id, "calls": len(calls)}
+
+    monkeypatch.setattr(server, "compute_analytics_summary", compute_analytics_summary)
+    server.analytics_cache.clear()
+    server.analytics_locks.clear()
+    yield calls
+    server.analytics_cache.clear()
+    server.analytics_locks.clear()
+
+
+def make_batch() -> FaceBatchResult:
+    return FaceBatchResult(
+        bboxes=np.array([[1, 2, 3, 4], [5, 6, 7, 8]], dtype=np.int32),
+        confidences=np.array([0.9, 0.5]),
+        ages=np.array([30, 20], dtype=np.int32),
+        age_confidences=np.array([0.8, 0.0]),
+        races=["Asian", "Unknown"],
+        race_confidences=np.array([0.7, 0.0]),
+        emotions=["Happy", "Sad"],
+        emotion_confidences=np.array([0.6, 0.4]),
+        landmark_counts=np.array([10, 0], dtype=np.int32),
+    )
+
+
+def test_results_data_serializes_batch_columns(server):
+    results = server.results_data(make_batch())
+
+    assert results[0] == {
+        "face_id": 1,
+        "bbox": {"x": 1, "y": 2, "width": 3, "height": 4},
+        "confidence": 0.9,
+        "age": {"value": 30, "confidence": 0.8},
+        "race": {"value": "Asian", "confidence": 0.7},
+        "emotion": {"value": "Happy", "confidence": 0.6},
+        "landmarks_count": 10,
+    }
+    assert results[1]["race"] == {"value": "Unknown", "confidence": 0.0}
+    # Plain Python values: serializable without numpy support
+    assert orjson.loads(orjson.dumps(results)) == results
+
+
+def test_results_data_and_summary_without_faces(server):
+    assert server.results_data(FaceBatchResult.empty()) == []
+    assert server.summarize_results(FaceBatchResult.empty()) == (0.0, 0.0)
+
+
+def test_summarize_results(server):
+    total_confidence, avg_age = server.summarize_results(make_batch())
+
+    assert total_confidence == pytest.approx(1.4)
+    assert avg_age == 25.0
+
+
+def test_run_batch_runs_on_the_analyzer_executor(server, monkeypatch):
+    class InferenceAnalyzer:
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+        def analyze_batch(self, images, rgb_images):
+            return [threading.current_thread().name for _ in images]
+
+    batch_analyzer = InferenceAnalyzer()
+
+    async def run_one():
+        monkeypatch.setattr(server, "idle_analyzers", asyncio.Queue())
+        future = asyncio.get_running_loop().create_future()
+        await server.run_batch(batch_analyzer, [(np.zeros((4, 4, 3), dtype=np.uint8), None, future)])
+        return await future, server.idle_analyzers.get_nowait()
+
+    thread_name, idle = asyncio.run(run_one())
+    batch_analyzer.executor.shutdown()
+
+    assert thread_name.startswith("inference")
+    assert idle is batch_analyzer
+
+
+def test_analyze_image_reads_raw_body(server, client):
+    response = client.post("/api/analyze-image", content=b"not really an image",
+                           headers={"content-type": "image/jpeg"})
+
+    assert response.status_code == 200
+    assert response.json()["faces_detected"] == 0
+    assert response.json()["image_info"] == {"format": "raw", "size": 19, "faces_found": 0}
+    assert server.analyzer.decoded == [b"not really an image"]
+
+
+def test_analyze_image_rejects_oversized_body(server, client, monkeypatch):
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", 16)
+
+    response = client.post("/api/analyze-image", content=b"x" * 17)
+
+    assert response.status_code == 413
+    assert server.analyzer.decoded == []
+
+
+def test_analyze_image_rejects_oversized_chunked_body(server, client, monkeypatch):
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", 16)
+
+    # A generator body is sent chunked, without a content-length
+    response = client.post("/api/analyze-image", content=(b"x" * 8 for _ in range(3)))
+
+    assert response.status_code == 413
+    assert server.analyzer.decoded == []
+
+
+def test_analyze_image_legacy_json(server, client):
+    response = client.post("/api/analyze-image", json={"image_data": "aGVsbG8=", "session_id": "s1"})
+
+    assert response.status_code == 200
+    assert response.json()["image_info"]["format"] == "base64"
+    assert server.analyzer.decoded == ["aGVsbG8="]
+
+
+def test_analyze_image_invalid_legacy_json_is_validation_error(client):
+    response = client.post("/api/analyze-image", content=b'{"session_id": 1',
+                           headers={"content-type": "application/json"})
+
+    assert response.status_code == 422
+    assert isinstance(response.json()["detail"], list)
+
+
+def test_analytics_summary_is_cached(client, analytics):
+    first = client.get("/api/analytics/summary", params={"session_id": "a"}).json()
+    second = client.get("/api/analytics/summary", params={"session_id": "a"}).json()
+
+    assert first == second == {"session": "a", "calls": 1}
+    assert analytics == ["a"]
+
+
+def test_analytics_cache_evicts_least_recently_used(server, client, analytics, monkeypatch):
+    monkeypatch.setattr(server, "ANALYTICS_CACHE_MAX_ENTRIES", 2)
+
+    for session_id in ("a", "b", "a", "c"):
+        client.get("/api/analytics/summary", params={"session_id": session_id})
+
+    assert list(server.analytics_cache) == ["a", "c"]
+    assert set(server.analytics_locks) <= {"a", "c"}
+    assert analytics == ["a", "b", "c"]
+
+
+def test_analytics_summary_single_flight(server, analytics):
+    async def concurrent_requests():
+        return await asyncio.gather(*(server.get_analytics_summary("a") for _ in range(5)))
+
+    summaries = asyncio.run(concurrent_requests())
+
+    assert analytics == ["a"]
+    assert all(summary == summaries[0] for summary in summaries)
+
+
+class FakeCollection:
+    """Records history writes and deletes instead of sending them to MongoDB"""
+
+    def __init__(self):
+        self.written = []
+        self.deleted = []
+
+    async def bulk_write(self, ops, ordered=True):
+        self.written.extend(ops)
+
+    async def delete_many(self, query):
+        self.deleted.append(query)
+        return type("DeleteResult", (), {"deleted_count": 0})()
+
+
+def test_clearing_session_history_invalidates_its_summary(server, client, analytics, monkeypatch):
+    history = FakeCollection()
+    monkeypatch.setattr(server, "db", type("FakeDatabase", (), {"analysis_history": history})())
+    for session_id in ("a", "b", None):
+        client.get("/api/analytics/summary", params={"session_id": session_id})
+
+    client.delete("/api/analysis-history", params={"session_id": "a"})
+
+    assert history.deleted == [{"session_id": "a"}]
+    assert list(server.analytics_cache) == ["b"]
+    assert client.get("/api/analytics/summary", params={"session_id": "a"}).json()["calls"] == 4
+
+
+def test_clearing_all_history_invalidates_every_summary(server, client, analytics, monkeypatch):
+    monkeypatch.setattr(server, "db", type("FakeDatabase", (), {"analysis_history": FakeCollection()})())
+    for session_id in ("a", "b"):
+        client.get("/api/analytics/summary", params={"session_id": session_id})
+
+    client.delete("/api/analysis-history")
+
+    assert not server.analytics_cache
+
+
+def test_writing_history_invalidates_its_sessions(server, client, analytics, monkeypatch):
+    history = FakeCollection()
+    monkeypatch.setattr(server, "history_col", history)
+    for session_id in ("a", "b", None):
+        client.get("/api/analytics/summary", params={"session_id": session_id})
+
+    asyncio.run(server.write_history([{"session_id": "a"}]))
+
+    assert len(history.written) == 1
+    assert list(server.analytics_cache) == ["b"]
+
+
+def test_summary_computed_across_an_invalidation_is_not_cached(server, client, analytics, monkeypatch):
+    async def compute_analytics_summary(session_id):
+        # History written while the aggregation runs
+        server.invalidate_analytics([session_id])
+        return {"session": session_id}
+
+    monkeypatch.setattr(server, "compute_analytics_summary", compute_analytics_summary)
+
+    assert client.get("/api/analytics/summary", params={"session_id": "a"}).json() == {"session": "a"}
+    assert not server.analytics_cache
+
+
+def test_flush_history_waits_for_queued_entries(server, monkeypatch):
+    history = FakeCollection()
+    monkeypatch.setattr(server, "history_col", history)
+    monkeypatch.setattr(server, "history_pending", 0)
+
+    async def queue_and_flush():
+        monkeypatch.setattr(server, "history_queue", asyncio.Queue())
+        flusher = asyncio.create_task(server.history_flusher())
+        monkeypatch.setattr(server, "history_flusher_task", flusher)
+        server.queue_history({"session_id": "a"})
+        server.queue_history({"session_id": "b"})
+        await server.flush_history()
+        written = len(history.written)
+        server.history_queue.put_nowait(None)
+        await flusher
+        return written
+
+    assert asyncio.run(queue_and_flush()) == 2
+    assert server.history_pending == 0
+
+
+def test_flush_history_without_pending_entries_returns_at_once(server, monkeypatch):
+    monkeypatch.setattr(server, "history_pending", 0)
+
+    asyncio.run(asyncio.wait_for(server.flush_history(), 0.01))
@@ -0,0 +1,239 @@
+import os
+import sys
+
+import pytest
+
+import start_server
+from start_server import ServerManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """ServerManager for a project tree under tmp_path"""
+    manager = ServerManager()
+    manager.base_dir = tmp_path
+    manager.backend_dir = tmp_path / "backend"
+    manager.frontend_dir = tmp_path / "frontend"
+    manager.backend_dir.mkdir()
+    manager.frontend_dir.mkdir()
+    return manager
+
+
+def logged(manager, job):
+    """Run job with its log lines collected instead of printed"""
+    manager._log_buffer.lines = []
+    try:
+        return job(), manager._log_buffer.lines
+    finally:
+        manager._log_buffer.lines = None
+
+
+def test_deps_stamp_depends_on_every_input(manager):
+    stamp = manager.deps_stamp(manager.frontend_dir, b"package", b"lock")
+
+    assert stamp == manager.deps_stamp(manager.frontend_dir, b"package", b"lock")
+    assert stamp != manager.deps_stamp(manager.frontend_dir, b"package", b"lock2")
+    assert stamp.parent == manager.frontend_dir / ".deps_cache"
+    assert stamp.suffix == ".ok"
+
+
+def test_write_deps_stamp_replaces_old_stamps(manager):
+    old = manager.deps_stamp(manager.frontend_dir, b"old")
+    new = manager.deps_stamp(manager.frontend_dir, b"new")
+
+    manager.write_deps_stamp(old)
+    manager.write_deps_stamp(new)
+
+    assert new.exists() and not old.exists()
+
+
+def test_backend_stamp_follows_requirements(manager):
+    assert manager.backend_deps_stamp() is None
+
+    requirements = manager.backend_dir / "requirements.txt"
+    requirements.write_text("fastapi==0.110.1\n")
+    stamp = manager.backend_deps_stamp()
+    requirements.write_text("fastapi==0.110.2\n")
+
+    assert manager.backend_deps_stamp() != stamp
+
+
+def test_probe_frontend_uses_stamp_while_node_modules_exists(manager):
+    (manager.frontend_dir / "package.json").write_text("{}")
+    (manager.frontend_dir / "node_modules").mkdir()
+    manager.write_deps_stamp(manager.frontend_deps_stamp())
+
+    result, lines = logged(manager, manager.probe_frontend)
+
+    assert result == (True, [])
+    assert any("(cached)" in line for line in lines)
+
+
+def test_probe_frontend_reports_missing_node_modules_not_a_change(manager):
+    (manager.frontend_dir / "package.json").write_text("{}")
+    manager.write_deps_stamp(manager.frontend_deps_stamp())
+
+    result, lines = logged(manager, manager.probe_frontend)
+
+    assert result == (False, ["node_modules"])
+    assert any("node_modules tidak ditemukan" in line for line in lines)
+    assert not any("berubah" in line for line in lines)
+
+
+def test_probe_frontend_reports_changed_manifest(manager):
+    (manager.frontend_dir / "package.json").write_text("{}")
+    (manager.frontend_dir / "node_modules").mkdir()
+    manager.write_deps_stamp(manager.frontend_deps_stamp())
+    (manager.frontend_dir / "package.json").write_text('{"name": "frontend"}')
+
+    result, lines = logged(manager, manager.probe_frontend)
+
+    assert result == (False, ["node_modules"])
+    assert any("berubah" in line for line in lines)
+
+
+@pytest.mark.parametrize("backend_probe, frontend_probe, installed, expected", [
+    ((False, None), (False, ["node_modules"]), ["frontend"], False),
+    ((False, ["fastapi"]), (False, None), ["backend"], False),
+    ((False, ["fastapi"]), (False, ["node_modules"]), ["backend", "frontend"], True),
+    ((True, []), (True, []), [], True),
+])
+def test_install_dependencies_runs_each_side_on_its_own(manager, monkeypatch,
+                                                        backend_probe, frontend_probe, installed, expected):
+    calls = []
+    monkeypatch.setattr(manager, "probe_backend", lambda: backend_probe)
+    monkeypatch.setattr(manager, "probe_frontend", lambda: frontend_probe)
+    monkeypatch.setattr(manager, "install_backend_dependencies", lambda missing: calls.append("backend") or True)
+    monkeypatch.setattr(manager, "install_frontend_dependencies", lambda: calls.append("frontend") or True)
+
+    assert manager.install_dependencies() is expected
+    assert sorted(calls) == installed
+
+
+def run_install(manager, monkeypatch, capsys, returncode):
+    """Install the frontend with a fake yarn printing one line; return the printed lines"""
+    (manager.frontend_dir / "package.json").write_text("{}")
+    command = [sys.executable, "-c", f"print('yarn output'); raise SystemExit({returncode})"]
+    run_streamed = manager.run_streamed
+    monkeypatch.setattr(manager, "run_streamed", lambda _command, cwd, label: run_streamed(command, cwd, label))
+
+    manager.run_buffered(manager.install_frontend_dependencies)
+    return capsys.readouterr().out.splitlines()
+
+
+def test_install_output_is_printed_in_order(manager, monkeypatch, capsys):
+    lines = run_install(manager, monkeypatch, capsys, 0)
+
+    assert lines == ["📦 Installing frontend dependencies...", "  [yarn] yarn output",
+                     "✅ Frontend dependencies installed"]
+
+
+def test_failed_install_output_is_printed_once(manager, monkeypatch, capsys):
+    lines = run_install(manager, monkeypatch, capsys, 1)
+
+    assert lines == ["📦 Installing frontend dependencies...", "  [yarn] yarn output",
+                     "❌ Gagal install frontend dependencies (exit code 1)"]
+
+
+def test_parse_requirements(manager):
+    requirements = manager.backend_dir / "requirements.txt"
+    requirements.write_text("\n".join([
+        "# comment",
+        "",
+        "-r base.txt",
+        "--index-url https://example.org/simple",
+        "FastAPI==0.110.1  # web framework",
+        "uvicorn[standard]>=0.25",
+        'legacy-package==1.0; python_version < "3"',
+        "not a requirement!!",
+        "Scikit_Learn",
+    ]))
+
+    assert manager.parse_requirements(requirements) == {
+        "fastapi": "FastAPI==0.110.1",
+        "uvicorn": "uvicorn[standard]>=0.25",
+        "scikit-learn": "Scikit_Learn",
+    }
+
+
+def test_parse_requirements_without_file(manager):
+    assert manager.parse_requirements(manager.backend_dir / "requirements.txt") == {}
+
+
+def test_check_backend_dependencies_returns_missing_requirement_lines(manager, monkeypatch):
+    (manager.backend_dir / "requirements.txt").write_text("fastapi==0.110.1\nNot_Installed>=2\n")
+    monkeypatch.setattr(manager, "get_installed_packages", lambda: {"fastapi"})
+
+    missing, _ = logged(manager, manager.check_backend_dependencies)
+
+    assert missing == ["Not_Installed>=2"]
+
+
+@pytest.mark.parametrize("env, args, mode", [
+    ({}, [], "single process"),
+    ({"WEB_CONCURRENCY": "4"}, ["--workers", "4"], "4 workers"),
+    ({"SFA_DEV": "1", "WEB_CONCURRENCY": "4"}, ["--reload", "--reload-dir", "{backend}",
+                                                "--reload-exclude", "model_cache"], "dev, auto-reload"),
+])
+def test_start_backend_arguments(manager, monkeypatch, capsys, env, args, mode):
+    monkeypatch.delenv("SFA_DEV", raising=False)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    started = []
+    monkeypatch.setattr(start_server.subprocess, "Popen", lambda command, **kwargs: started.append(command))
+
+    assert manager.start_backend()
+
+    [command] = started
+    assert command[:8] == [sys.executable, "-m", "uvicorn", "server:app", "--host", "0.0.0.0", "--port", "8001"]
+    assert command[8:] == [arg.format(backend=manager.backend_dir) for arg in args]
+    assert f"({mode})" in capsys.readouterr().out
+
+
+@pytest.fixture
+def prereqs_cache(tmp_path, monkeypatch):
+    cache_file = tmp_path / "cache" / "prereqs.json"
+    monkeypatch.setattr(start_server, "PREREQS_CACHE_FILE", cache_file)
+    return cache_file
+
+
+def test_prerequisites_cache_key_follows_path_and_python(manager, monkeypatch):
+    key = manager.prerequisites_cache_key()
+    assert key == manager.prerequisites_cache_key()
+
+    monkeypatch.setenv("PATH", "/elsewhere/bin")
+    path_key = manager.prerequisites_cache_key()
+    monkeypatch.setattr(start_server.sys, "executable", "/elsewhere/bin/python3")
+
+    assert len({key, path_key, manager.prerequisites_cache_key()}) == 3
+
+
+def test_prerequisites_cache_roundtrip(manager, prereqs_cache):
+    assert manager.load_prerequisites_cache() is None
+
+    manager.save_prerequisites_cache(["Python 3.11.7", "v20.0.0", "1.22.22"])
+
+    assert manager.load_prerequisites_cache() == ["Python 3.11.7", "v20.0.0", "1.22.22"]
+
+
+def test_prerequisites_cache_misses_on_new_path(manager, prereqs_cache, monkeypatch):
+    manager.save_prerequisites_cache(["Python 3.11.7", "v20.0.0", "1.22.22"])
+    monkeypatch.setenv("PATH", "/elsewhere/bin")
+
+    assert manager.load_prerequisites_cache() is None
+
+
+def test_prerequisites_cache_expires(manager, prereqs_cache):
+    manager.save_prerequisites_cache(["Python 3.11.7", "v20.0.0", "1.22.22"])
+    expired = prereqs_cache.stat().st_mtime - start_server.PREREQS_CACHE_TTL - 1
+    os.utime(prereqs_cache, (expired, expired))
+
+    assert manager.load_prerequisites_cache() is None
+
+
+def test_prerequisites_cache_ignores_corrupt_file(manager, prereqs_cache):
+    prereqs_cache.parent.mkdir()
+    prereqs_cache.write_text("not json")
+
+    assert manager.load_prerequisites_cache() is None